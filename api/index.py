@@ -9,4 +9,13 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stylemaxx.settings")
 
 from django.core.wsgi import get_wsgi_application
 
-app = get_wsgi_application()
\ No newline at end of file
+app = get_wsgi_application()
+
+# build catalogs, indexes and clients during the platform's init phase,
+# not inside the first user request
+from django.conf import settings
+
+if getattr(settings, "WARMUP_ON_START", False):
+    from core.warmup import run_warmup
+
+    run_warmup()
\ No newline at end of file
@@ -0,0 +1,14 @@
+#!/bin/bash
+# Vercel build step: hashed + precompressed static files into staticfiles/
+# (STATIC_ROOT), which vercel.json serves under /static/.
+set -e
+python3 -m pip install -r requirements.txt
+# The Python function doesn't get this build's output: it hashes the committed
+# static/ sources itself (core/storage.py), so the committed stylesheet must be
+# exactly what the templates compile to. A class the compiler has no rule for
+# fails the build too, instead of shipping unstyled.
+python3 manage.py build_css --strict --check
+# the function trusts core/data/asset_manifest.json (sha256 = try-on cache key);
+# an image added or replaced without rebuilding it fails the deploy here
+python3 manage.py build_asset_manifest --check
+python3 manage.py collectstatic --noinput --clear
@@ -0,0 +1,135 @@
+"""
+Manifest of the static images the views serve or send to the image API
+(products, garment cutouts, outfits, models).
+
+Built once by `manage.py build_asset_manifest` into core/data/asset_manifest.json
+and loaded with the catalog, so request-time lookups are dict hits instead of
+stat() calls and image hashing. Entries are trusted as they are; the deploy
+build (build_files.sh) runs `build_asset_manifest --check`, which fails when
+an image was added or replaced without rebuilding the manifest. A path that
+isn't in the manifest at all is still looked up on disk (and described once
+per process), so a new image is never treated as missing.
+"""
+from collections import OrderedDict
+from django.conf import settings
+from pathlib import Path
+from PIL import Image
+import hashlib
+import json
+import threading
+
+# sub-directories of static/ that end up in the manifest
+ASSET_DIRS = ("products", "outfits", "models", "prerendered")
+ASSET_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+
+FILE_HASH_CACHE_SIZE = 256
+
+_ASSET_MANIFEST = None
+# (path, size, mtime_ns) -> sha256 of files outside the manifest, LRU
+_FILE_HASHES = OrderedDict()
+_FILE_HASHES_LOCK = threading.Lock()
+
+
+def static_dir() -> Path:
+    return Path(settings.BASE_DIR) / "static"
+
+def asset_manifest_path() -> Path:
+    return Path(settings.BASE_DIR) / "core" / "data" / "asset_manifest.json"
+
+def describe_asset(path: Path, rel: str):
+    """Path, size, pixel dimensions and content hash of one image."""
+    data = path.read_bytes()
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+    except Exception:
+        width, height = None, None
+    return {
+        "path": rel,
+        "size": len(data),
+        "width": width,
+        "height": height,
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+
+def build_asset_manifest():
+    """Walk the asset dirs and describe every image. Returns {rel_path: entry}."""
+    root = static_dir()
+    manifest = {}
+    for dirname in ASSET_DIRS:
+        base = root / dirname
+        if not base.is_dir():
+            continue
+        for path in sorted(base.rglob("*")):
+            if path.is_file() and path.suffix.lower() in ASSET_SUFFIXES:
+                rel = path.relative_to(root).as_posix()
+                manifest[rel] = describe_asset(path, rel)
+    return manifest
+
+def write_asset_manifest(manifest):
+    out = asset_manifest_path()
+    with out.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return out
+
+def load_asset_manifest():
+    """
+    Load the prebuilt manifest; if it was never built, walk the static dir
+    once for this process instead.
+    """
+    global _ASSET_MANIFEST
+    if _ASSET_MANIFEST is None:
+        try:
+            with asset_manifest_path().open(encoding="utf-8") as f:
+                _ASSET_MANIFEST = json.load(f)
+        except (OSError, ValueError):
+            _ASSET_MANIFEST = build_asset_manifest()
+    return _ASSET_MANIFEST
+
+def get_asset(rel: str):
+    """Manifest entry for a static-relative path like 'products/p001.png', or None."""
+    manifest = load_asset_manifest()
+    entry = manifest.get(rel)
+    if entry is None:
+        # added since the manifest was built
+        path = static_dir() / rel
+        if path.is_file():
+            entry = manifest[rel] = describe_asset(path, rel)
+    return entry
+
+def get_garment_asset(product_id: str):
+    """Entry for the garment cutout sent to the try-on model (static/products/nano<ID>.png)."""
+    return get_asset(f"products/nano{product_id}.png")
+
+def asset_fs_path(entry) -> Path:
+    return static_dir() / entry["path"]
+
+def file_content_hash(path: Path):
+    """
+    sha256 of a file: from the manifest for static assets, else by reading it
+    (remembered per path, size and mtime, so generated models under
+    MEDIA_ROOT are hashed once rather than on every view).
+    """
+    try:
+        rel = Path(path).resolve().relative_to(static_dir().resolve()).as_posix()
+    except ValueError:
+        rel = None
+    entry = get_asset(rel) if rel else None
+    if entry:
+        return entry["sha256"]
+    try:
+        st = Path(path).stat()
+        key = (str(path), st.st_size, st.st_mtime_ns)
+        with _FILE_HASHES_LOCK:
+            digest = _FILE_HASHES.get(key)
+            if digest is not None:
+                _FILE_HASHES.move_to_end(key)
+                return digest
+        digest = hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return None
+    with _FILE_HASHES_LOCK:
+        _FILE_HASHES[key] = digest
+        while len(_FILE_HASHES) > FILE_HASH_CACHE_SIZE:
+            _FILE_HASHES.popitem(last=False)
+    return digest
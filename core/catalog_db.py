@@ -0,0 +1,155 @@
+"""
+Optional sqlite catalog backend (CATALOG_BACKEND = "sqlite").
+
+Products live in the configured sqlite database instead of every worker's
+memory: one row per product with an indexed category column, plus an FTS5
+index over the keywords. Ranking (sum of the user's keyword counts over the
+product's keywords, then name) runs inside a single query that only returns
+the requested page.
+"""
+from django.db import connection, transaction
+import json
+import re
+
+_INDEX_READY_VERSION = None
+
+# one FTS token per keyword: "urban classics" -> "urban_classics"
+_FTS_TOKENIZER = "unicode61 tokenchars '_'"
+
+
+def keyword_token(kw: str) -> str:
+    return re.sub(r"\W+", "_", (kw or "").lower()).strip("_")
+
+def _check_backend():
+    if connection.vendor != "sqlite":
+        raise RuntimeError("The sqlite catalog backend needs a sqlite default database.")
+
+def _create_tables(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT)"
+    )
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS catalog_product ("
+        " id TEXT PRIMARY KEY,"
+        " category TEXT,"
+        " name TEXT NOT NULL,"
+        " price REAL,"
+        " data TEXT NOT NULL)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS catalog_product_category_name"
+        " ON catalog_product (category, name)"
+    )
+    cursor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5("
+        f" product_id UNINDEXED, keywords, tokenize=\"{_FTS_TOKENIZER}\")"
+    )
+
+def indexed_catalog_version():
+    _check_backend()
+    with connection.cursor() as cursor:
+        _create_tables(cursor)
+        cursor.execute("SELECT value FROM catalog_meta WHERE key = 'version'")
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+def rebuild_catalog_index(products, version):
+    """Replace the indexed catalog with `products` (dicts as returned by load_products)."""
+    _check_backend()
+    global _INDEX_READY_VERSION
+    with transaction.atomic(), connection.cursor() as cursor:
+        _create_tables(cursor)
+        cursor.execute("DELETE FROM catalog_product")
+        cursor.execute("DELETE FROM catalog_fts")
+        cursor.executemany(
+            "INSERT INTO catalog_product (id, category, name, price, data) VALUES (%s, %s, %s, %s, %s)",
+            [
+                (p["id"], p.get("category"), p.get("name", ""), p.get("price"),
+                 json.dumps(p, ensure_ascii=False))
+                for p in products
+            ],
+        )
+        cursor.executemany(
+            "INSERT INTO catalog_fts (product_id, keywords) VALUES (%s, %s)",
+            [
+                (p["id"], " ".join(keyword_token(kw) for kw in p.get("keywords", []) or []))
+                for p in products
+            ],
+        )
+        cursor.execute(
+            "INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('version', %s)", [version]
+        )
+    _INDEX_READY_VERSION = version
+    return len(products)
+
+def ensure_catalog_index(version, read_products):
+    """
+    Build the index if it is missing or was built from another catalog version.
+    `read_products` is only called on rebuild; checked once per process.
+    """
+    global _INDEX_READY_VERSION
+    if _INDEX_READY_VERSION == version:
+        return
+    if indexed_catalog_version() != version:
+        rebuild_catalog_index(read_products(), version)
+    _INDEX_READY_VERSION = version
+
+def query_scored_products(kw_counts, category=None, limit=None, offset=0, positive_only=False):
+    """
+    Products ordered by (score desc, name), one page at a time.
+    Each preferred keyword is an FTS lookup carrying its count as weight;
+    the weights are summed per product inside the query.
+    """
+    _check_backend()
+    weights = {}
+    for kw, count in (kw_counts or {}).items():
+        token = keyword_token(kw)
+        if token and count:
+            weights[token] = weights.get(token, 0) + count
+
+    params = []
+    if weights:
+        parts = []
+        for token, weight in weights.items():
+            parts.append("SELECT product_id, %s AS weight FROM catalog_fts WHERE keywords MATCH %s")
+            params.extend([weight, f'"{token}"'])
+        scores_sql = (
+            "SELECT product_id, SUM(weight) AS score FROM ("
+            + " UNION ALL ".join(parts)
+            + ") GROUP BY product_id"
+        )
+    else:
+        scores_sql = "SELECT NULL AS product_id, 0 AS score WHERE 0"
+
+    where = []
+    if category:
+        categories = [category] if isinstance(category, str) else list(category)
+        where.append(f"p.category IN ({', '.join(['%s'] * len(categories))})")
+        params.extend(categories)
+    if positive_only:
+        where.append("s.score > 0")
+
+    sql = (
+        f"WITH scores AS ({scores_sql}) "
+        "SELECT p.data FROM catalog_product p "
+        f"{'JOIN' if positive_only else 'LEFT JOIN'} scores s ON s.product_id = p.id "
+        + (f"WHERE {' AND '.join(where)} " if where else "")
+        + "ORDER BY COALESCE(s.score, 0) DESC, p.name "
+        "LIMIT %s OFFSET %s"
+    )
+    params.extend([-1 if limit is None else limit, offset])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [json.loads(row[0]) for row in cursor.fetchall()]
+
+def get_products_by_ids(ids):
+    _check_backend()
+    ids = [i for i in ids if i]
+    if not ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT data FROM catalog_product WHERE id IN ({placeholders})", ids)
+        products = [json.loads(row[0]) for row in cursor.fetchall()]
+    return {p["id"]: p for p in products}
@@ -0,0 +1,130 @@
+"""
+Product categories: one compiled regex classifies a product's name and
+keywords into top / bottom / outerwear / shoes / accessories.
+
+Classification runs once per catalog version. `manage.py
+build_category_index` writes the result to core/data/category_index.json:
+the category of every product row plus, per category, the rows sorted by
+name, so the JSON catalog scan only touches one category's rows. With no
+keyword weights the candidate pool is a plain slice of that list.
+"""
+from django.conf import settings
+from heapq import merge
+from pathlib import Path
+import json
+import re
+
+# bump when the patterns change, so persisted indexes/catalog files get rebuilt
+CLASSIFIER_VERSION = "2"
+
+# when a product matches several categories, the first one here wins
+# ("Polo Ralph Lauren ... Chino Pant" is a bottom, a "shirt jacket" outerwear)
+CATEGORY_PATTERNS = (
+    ("shoes", r"sneakers?|shoes?|boots?|trainers|loafers?|sandals?|slides"),
+    ("bottom", r"pants?|jeans|cargos?|chinos?|trousers|shorts|joggers|sweatpants|\w*broek"),
+    ("outerwear", r"jackets?|windjacks?|windbreakers?|coats?|parkas?|puffers?|bombers?|blazers?|gilets?|outerwear"),
+    ("top", r"t-?shirts?|tees?|hoodies?|sweatshirts?|shirts?|longsleeves?|sweaters?|crewnecks?|polo shirts?|tops?"),
+    ("accessories", r"caps?|hats?|beanies?|belts?|bags?|scarf|scarves|sunglasses|socks|watch(?:es)?|wallets?|necklaces?|bracelets?|gloves"),
+)
+CATEGORIES = tuple(name for name, _ in CATEGORY_PATTERNS)
+_PRIORITY = {name: i for i, name in enumerate(CATEGORIES)}
+
+_CLASSIFIER = re.compile(
+    "|".join(rf"(?P<{name}>\b(?:{pattern})\b)" for name, pattern in CATEGORY_PATTERNS),
+    re.IGNORECASE,
+)
+
+# product categories that can fill each slot of a top + bottom outfit
+OUTFIT_SLOTS = {
+    "top": ("top", "outerwear"),
+    "bottom": ("bottom",),
+}
+
+_CATEGORY_INDEX = None
+
+
+def classify_product(p):
+    """Category of one product from its name and keywords, or None."""
+    text = " | ".join([p.get("name", ""), *(p.get("keywords", []) or [])])
+    found = {m.lastgroup for m in _CLASSIFIER.finditer(text)}
+    if not found:
+        return None
+    return min(found, key=_PRIORITY.__getitem__)
+
+def outfit_slot(category):
+    """'top' / 'bottom' for a product category that fits an outfit slot, else None."""
+    for slot, categories in OUTFIT_SLOTS.items():
+        if category in categories:
+            return slot
+    return None
+
+def category_index_path() -> Path:
+    return Path(settings.BASE_DIR) / "core" / "data" / "category_index.json"
+
+def build_category_index(products, version):
+    """
+    {"version", "categories": [category per row], "by_category": {category: [rows sorted by name]},
+    "by_name": [all rows sorted by name]} for raw product dicts in file order.
+    """
+    categories = [classify_product(p) for p in products]
+    by_name = sorted(range(len(products)), key=lambda i: products[i].get("name", ""))
+    by_category = {}
+    for row in by_name:
+        if categories[row]:
+            by_category.setdefault(categories[row], []).append(row)
+    return {
+        "version": version,
+        "categories": categories,
+        "by_category": by_category,
+        "by_name": by_name,
+    }
+
+def write_category_index(index):
+    out = category_index_path()
+    with out.open("w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    return out
+
+def load_category_index(version, products):
+    """
+    The persisted index if it matches this catalog version; otherwise classify
+    `products` (raw dicts in file order) now, once per process.
+    """
+    global _CATEGORY_INDEX
+    if _CATEGORY_INDEX is not None and _CATEGORY_INDEX["version"] == version:
+        return _CATEGORY_INDEX
+    try:
+        with category_index_path().open(encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = None
+    if not index or index.get("version") != version or len(index["categories"]) != len(products):
+        index = build_category_index(products, version)
+    index["_merged"] = {}
+    _CATEGORY_INDEX = index
+    return _CATEGORY_INDEX
+
+def category_rows(index, category=None):
+    """
+    Name-sorted product rows of a category, a tuple of categories (merged),
+    or the whole catalog when `category` is None.
+    """
+    if not category:
+        return index["by_name"]
+    if isinstance(category, str):
+        return index["by_category"].get(category, [])
+    key = tuple(sorted(category))
+    rows = index["_merged"].get(key)
+    if rows is None:
+        rank = {row: r for r, row in enumerate(index["by_name"])}
+        rows = list(merge(*(index["by_category"].get(c, []) for c in key), key=rank.__getitem__))
+        index["_merged"][key] = rows
+    return rows
+
+def matches_category(value, category):
+    """Filter helper for the other backends: `category` is None, one category or a tuple of them."""
+    if not category:
+        return True
+    if isinstance(category, str):
+        return value == category
+    return value in category
@@ -0,0 +1,279 @@
+"""
+Compact, array-backed product catalog shared by all worker processes
+(CATALOG_BACKEND = "compact").
+
+Instead of a list of dicts per worker, the catalog is one file of columns:
+interned strings (sorted, so lookups are a bisect), per-product string ids,
+a float64 price column, uint8 category codes, a precomputed name-order rank
+and CSR keyword-id arrays. Every worker mmaps the same file, so the pages are
+shared through the OS page cache instead of being copied into each process.
+
+Rows still read like the old dicts: `catalog[i]` / `catalog.get_by_ids(...)`
+return CatalogProduct mappings, which work with `p["name"]`, `p.get(...)`
+and `{{ product.static_path }}` in templates.
+"""
+from collections.abc import Mapping
+from django.conf import settings
+from array import array
+from pathlib import Path
+import json
+import math
+import mmap
+import os
+import struct
+
+_MAGIC = b"SMXCAT01"
+_COMPACT_CATALOG = None
+
+_STRING_COLUMNS = ("id", "name", "currency", "url", "shop")
+
+
+def compact_catalog_path() -> Path:
+    return Path(getattr(settings, "COMPACT_CATALOG_PATH", "") or
+                Path(settings.BASE_DIR) / "core" / "data" / "catalog.bin")
+
+def build_compact_catalog_bytes(products, version):
+    """Serialize products (dicts as returned by read_products_file) into the columnar layout."""
+    strings = set()
+    for p in products:
+        for col in _STRING_COLUMNS:
+            strings.add(str(p.get(col) or ""))
+        strings.update(p.get("keywords", []) or [])
+    # sorted by utf-8 bytes so a string can be found by bisecting the table
+    encoded = sorted(s.encode("utf-8") for s in strings)
+    sid = {b.decode("utf-8"): i for i, b in enumerate(encoded)}
+    string_offsets = array("I", [0])
+    for b in encoded:
+        string_offsets.append(string_offsets[-1] + len(b))
+    string_blob = b"".join(encoded)
+
+    categories = sorted({p.get("category") or "" for p in products})
+    category_code = {c: i for i, c in enumerate(categories)}
+
+    n = len(products)
+    columns = {col: array("I", (sid[str(p.get(col) or "")] for p in products)) for col in _STRING_COLUMNS}
+    price = array("d", (math.nan if p.get("price") is None else float(p["price"]) for p in products))
+    category = array("B", (category_code[p.get("category") or ""] for p in products))
+
+    by_name = sorted(range(n), key=lambda i: products[i].get("name", ""))
+    name_rank = array("I", [0] * n)
+    for rank, i in enumerate(by_name):
+        name_rank[i] = rank
+    # rows ordered by id string, for id lookups without a per-process dict
+    id_order = array("I", sorted(range(n), key=lambda i: str(products[i]["id"]).encode("utf-8")))
+
+    kw_offsets, kw_ids = array("I", [0]), array("I")
+    for p in products:
+        kw_ids.extend(sid[kw] for kw in p.get("keywords", []) or [])
+        kw_offsets.append(len(kw_ids))
+
+    sections = [
+        ("price", price), ("string_offsets", string_offsets),
+        *[(f"{col}_sid", columns[col]) for col in _STRING_COLUMNS],
+        ("name_rank", name_rank), ("id_order", id_order),
+        ("kw_offsets", kw_offsets), ("kw_ids", kw_ids),
+        ("category", category), ("strings", array("B", string_blob)),
+    ]
+    header = {"version": version, "count": n, "categories": categories, "sections": {}}
+    offset = 0
+    for name, arr in sections:
+        header["sections"][name] = [arr.typecode, offset, len(arr)]
+        offset += len(arr) * arr.itemsize
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-(len(_MAGIC) + 4 + len(header_bytes)) % 8)  # keep float64 column aligned
+    body = b"".join(arr.tobytes() for _, arr in sections)
+    return _MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes + body
+
+def write_compact_catalog(products, version, path=None):
+    data = build_compact_catalog_bytes(products, version)
+    out = Path(path or compact_catalog_path())
+    tmp = out.with_suffix(f"{out.suffix}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    tmp.replace(out)
+    return out, len(data)
+
+
+class CatalogProduct(Mapping):
+    """One row of a CompactCatalog, read as a product dict."""
+
+    __slots__ = ("_catalog", "_row")
+
+    _FIELDS = ("id", "name", "price", "currency", "url", "shop", "keywords", "static_path", "category")
+
+    def __init__(self, catalog, row):
+        self._catalog = catalog
+        self._row = row
+
+    def __getitem__(self, key):
+        c, row = self._catalog, self._row
+        if key in _STRING_COLUMNS:
+            return c.string(getattr(c, f"{key}_sid")[row])
+        if key == "price":
+            value = c.price[row]
+            return None if math.isnan(value) else value
+        if key == "keywords":
+            return [c.string(k) for k in c.kw_ids[c.kw_offsets[row]:c.kw_offsets[row + 1]]]
+        if key == "category":
+            return c.categories[c.category[row]] or None
+        if key == "static_path":
+            return f"products/{self['id']}.png"
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._FIELDS)
+
+    def __len__(self):
+        return len(self._FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, CatalogProduct):
+            return self._catalog is other._catalog and self._row == other._row
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<CatalogProduct {self['id']}>"
+
+
+class CompactCatalog:
+    """Read-only columnar catalog over an mmap (or bytes); a sequence of CatalogProduct."""
+
+    def __init__(self, buf):
+        self._buf = buf
+        if bytes(buf[:len(_MAGIC)]) != _MAGIC:
+            raise ValueError("Not a compact catalog file")
+        (header_len,) = struct.unpack_from("<I", buf, len(_MAGIC))
+        start = len(_MAGIC) + 4
+        header = json.loads(bytes(buf[start:start + header_len]))
+        body = memoryview(buf)[start + header_len:]
+
+        self.version = header["version"]
+        self.count = header["count"]
+        self.categories = header["categories"]
+        for name, (typecode, offset, length) in header["sections"].items():
+            size = array(typecode).itemsize
+            setattr(self, name, body[offset:offset + length * size].cast(typecode))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, row):
+        if not 0 <= row < self.count:
+            raise IndexError(row)
+        return CatalogProduct(self, row)
+
+    def __iter__(self):
+        return (CatalogProduct(self, row) for row in range(self.count))
+
+    # ----- strings -----
+    def _string_bytes(self, sid):
+        return bytes(self.strings[self.string_offsets[sid]:self.string_offsets[sid + 1]])
+
+    def string(self, sid):
+        return self._string_bytes(sid).decode("utf-8")
+
+    def string_id(self, value):
+        """Interned id of `value`, or None if no product uses that string."""
+        target = value.encode("utf-8")
+        lo, hi = 0, len(self.string_offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string_bytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.string_offsets) - 1 and self._string_bytes(lo) == target:
+            return lo
+        return None
+
+    # ----- lookups -----
+    def row_for_id(self, product_id):
+        sid = self.string_id(str(product_id))
+        if sid is None:
+            return None
+        # id_order lists rows sorted by id, i.e. by id string id
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.id_sid[self.id_order[mid]] < sid:
+                lo = mid + 1
+            else:
+                hi = mid
+        pos = lo
+        if pos < self.count and self.id_sid[self.id_order[pos]] == sid:
+            return self.id_order[pos]
+        return None
+
+    def get_by_ids(self, ids):
+        found = {}
+        for product_id in ids:
+            row = self.row_for_id(product_id) if product_id else None
+            if row is not None:
+                found[product_id] = CatalogProduct(self, row)
+        return found
+
+    def score(self, kw_counts, category=None, limit=None, offset=0, positive_only=False):
+        """
+        Same ranking as the JSON scan (keyword-count overlap desc, then name),
+        computed on integer keyword ids; only the returned rows are decoded.
+        """
+        weights = {}
+        for kw, count in (kw_counts or {}).items():
+            kid = self.string_id(kw)
+            if kid is not None and count:
+                weights[kid] = weights.get(kid, 0) + count
+
+        codes = None
+        if category:
+            wanted = {category} if isinstance(category, str) else set(category)
+            codes = {i for i, c in enumerate(self.categories) if c in wanted}
+            if not codes:
+                return []
+
+        scored = []
+        kw_offsets, kw_ids = self.kw_offsets, self.kw_ids
+        for row in range(self.count):
+            if codes is not None and self.category[row] not in codes:
+                continue
+            score = 0
+            if weights:
+                score = sum(weights.get(k, 0) for k in kw_ids[kw_offsets[row]:kw_offsets[row + 1]])
+            if positive_only and score <= 0:
+                continue
+            scored.append((-score, self.name_rank[row], row))
+
+        scored.sort()
+        end = None if limit is None else offset + limit
+        return [CatalogProduct(self, row) for _, _, row in scored[offset:end]]
+
+
+def load_compact_catalog(version, read_products):
+    """
+    Attach to the shared catalog file, (re)building it first if it is missing
+    or from another catalog version. If the file can't be written (read-only
+    deploys), the catalog is kept in this process's memory instead.
+    """
+    global _COMPACT_CATALOG
+    if _COMPACT_CATALOG is not None and _COMPACT_CATALOG.version == version:
+        return _COMPACT_CATALOG
+
+    path = compact_catalog_path()
+    catalog = _open_compact_catalog(path)
+    if catalog is None or catalog.version != version:
+        try:
+            write_compact_catalog(read_products(), version, path)
+            catalog = _open_compact_catalog(path)
+        except OSError:
+            catalog = CompactCatalog(build_compact_catalog_bytes(read_products(), version))
+
+    _COMPACT_CATALOG = catalog
+    return _COMPACT_CATALOG
+
+def _open_compact_catalog(path):
+    try:
+        with open(path, "rb") as f:
+            return CompactCatalog(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError):
+        return None
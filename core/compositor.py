@@ -0,0 +1,177 @@
+"""
+Local try-on placeholder: pastes the garment photos onto the base model with
+Pillow, no API call.
+
+Each known model has anchor polygons (where a top / a bottom goes, traced on
+the image); a garment is cropped from its nano<ID>.png photo, resized to the
+polygon's bounding box and pasted through the polygon as a soft mask. It is a
+rough 2D overlay, meant to be on screen within a few tens of milliseconds
+while the gpt-image-1 render is on its way, or instead of it when that fails.
+
+Per process we keep the decoded models with their rendered masks and an LRU
+of resized garment layers, so a composite is two pastes and a JPEG encode.
+"""
+from collections import OrderedDict
+from django.conf import settings
+from pathlib import Path
+from PIL import Image, ImageDraw, ImageFilter
+import os
+import threading
+
+from .assets import file_content_hash
+from .profiling import timed_phase
+from .singleflight import canonical_key
+
+# anchors are traced on the 1024x1024 default models and scaled to the real size
+ANCHOR_REF_SIZE = (1024, 1024)
+
+FEMALE_ANCHORS = {
+    "top": [
+        (478, 202), (440, 212), (392, 250), (388, 312), (415, 318), (416, 515),
+        (608, 515), (605, 318), (640, 312), (632, 240), (592, 212), (556, 202), (516, 222),
+    ],
+    "bottom": [
+        (416, 515), (420, 600), (440, 760), (448, 925), (505, 925), (512, 590),
+        (520, 925), (578, 925), (590, 760), (604, 600), (607, 515),
+    ],
+}
+
+MALE_ANCHORS = {
+    "top": [
+        (480, 190), (430, 205), (385, 245), (380, 330), (412, 338), (410, 535),
+        (608, 535), (600, 338), (652, 332), (645, 250), (600, 205), (562, 190), (520, 212),
+    ],
+    "bottom": [
+        (412, 530), (410, 620), (425, 770), (420, 918), (470, 918), (508, 625),
+        (518, 918), (578, 918), (585, 770), (598, 620), (600, 530),
+    ],
+}
+
+# static-relative model path -> anchors; generated models (selfies) use the fallback
+MODEL_ANCHORS = {
+    "models/default_female_model.png": FEMALE_ANCHORS,
+    "models/default_male_model.png": MALE_ANCHORS,
+}
+FALLBACK_ANCHORS = FEMALE_ANCHORS
+
+# part of a nano<ID>.png product photo that shows the garment, as (left, top, right, bottom) fractions
+GARMENT_CROPS = {
+    "top": (0.14, 0.26, 0.87, 0.86),
+    "bottom": (0.22, 0.14, 0.78, 0.84),
+}
+
+# bottoms first so a top's hem covers the waistband
+SLOT_ORDER = ("bottom", "top")
+
+LAYER_CACHE_SIZE = 64
+MASK_FEATHER = 2
+PREVIEW_JPEG_QUALITY = 85
+
+_MODELS = {}
+_LAYERS = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def anchors_for(model_path: Path):
+    static_root = Path(settings.BASE_DIR) / "static"
+    try:
+        rel = Path(model_path).resolve().relative_to(static_root.resolve()).as_posix()
+    except ValueError:
+        rel = None
+    return MODEL_ANCHORS.get(rel, FALLBACK_ANCHORS)
+
+def render_anchor_masks(size, anchors):
+    """{slot: (bbox, mask)}: each anchor polygon scaled to `size`, drawn as a feathered mask of its bbox."""
+    sx, sy = size[0] / ANCHOR_REF_SIZE[0], size[1] / ANCHOR_REF_SIZE[1]
+    masks = {}
+    for slot, polygon in anchors.items():
+        points = [(round(x * sx), round(y * sy)) for x, y in polygon]
+        xs, ys = [x for x, _ in points], [y for _, y in points]
+        bbox = (min(xs), min(ys), max(xs), max(ys))
+        mask = Image.new("L", (bbox[2] - bbox[0], bbox[3] - bbox[1]), 0)
+        ImageDraw.Draw(mask).polygon([(x - bbox[0], y - bbox[1]) for x, y in points], fill=255)
+        masks[slot] = (bbox, mask.filter(ImageFilter.GaussianBlur(MASK_FEATHER)))
+    return masks
+
+def load_model(model_path: Path):
+    """(RGB image, {slot: (bbox, mask)}) for a base model, decoded once per process."""
+    key = str(model_path)
+    mtime = Path(model_path).stat().st_mtime_ns
+    cached = _MODELS.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1], cached[2]
+
+    with Image.open(model_path) as img:
+        if img.mode in ("RGBA", "LA", "P"):
+            # transparent pixels → white, like the default model backgrounds
+            rgba = img.convert("RGBA")
+            base = Image.new("RGB", rgba.size, (255, 255, 255))
+            base.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            base = img.convert("RGB")
+    masks = render_anchor_masks(base.size, anchors_for(model_path))
+    with _LOCK:
+        _MODELS[key] = (mtime, base, masks)
+    return base, masks
+
+def garment_layer(garment_path: Path, slot, size):
+    """The garment crop of a product photo resized to `size`, from the LRU when possible."""
+    key = (file_content_hash(garment_path) or str(garment_path), slot, size)
+    with _LOCK:
+        layer = _LAYERS.get(key)
+        if layer is not None:
+            _LAYERS.move_to_end(key)
+            return layer
+
+    with Image.open(garment_path) as img:
+        img = img.convert("RGB")
+        left, top, right, bottom = GARMENT_CROPS[slot]
+        w, h = img.size
+        crop_box = (round(left * w), round(top * h), round(right * w), round(bottom * h))
+        # decode at reduced scale first: the 2000px photos only need a few hundred px
+        layer = img.resize(size, Image.Resampling.BILINEAR, box=crop_box, reducing_gap=2.0)
+
+    with _LOCK:
+        _LAYERS[key] = layer
+        while len(_LAYERS) > LAYER_CACHE_SIZE:
+            _LAYERS.popitem(last=False)
+    return layer
+
+def composite_tryon(model_path: Path, garments):
+    """
+    Paste garments onto the model. `garments` is a list of (slot, path) with
+    slot 'top' or 'bottom'; other slots are skipped. Returns an RGB image.
+    """
+    base, masks = load_model(model_path)
+    out = base.copy()
+    by_slot = {slot: path for slot, path in garments if slot in masks and slot in GARMENT_CROPS}
+    for slot in SLOT_ORDER:
+        if slot not in by_slot:
+            continue
+        bbox, mask = masks[slot]
+        layer = garment_layer(by_slot[slot], slot, mask.size)
+        out.paste(layer, bbox[:2], mask)
+    return out
+
+@timed_phase("compositor")
+def compose_tryon_preview(model_path: Path, garments):
+    """
+    Write the local composite under MEDIA_ROOT/tryon/ (reused for the same
+    model + garments). Returns (media_url, error).
+    """
+    hashes = [file_content_hash(model_path)] + [(slot, file_content_hash(path)) for slot, path in garments]
+    filename = f"tryon/{canonical_key('preview', hashes)}.jpg"
+    full_path = Path(settings.MEDIA_ROOT) / filename
+    if full_path.exists():
+        return settings.MEDIA_URL + filename, None
+
+    try:
+        image = composite_tryon(model_path, garments)
+    except (OSError, ValueError) as e:
+        return None, f"Local preview failed: {e}"
+
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = full_path.with_name(f"{full_path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+    image.save(tmp_path, "JPEG", quality=PREVIEW_JPEG_QUALITY)
+    os.replace(tmp_path, full_path)
+    return settings.MEDIA_URL + filename, None
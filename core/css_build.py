@@ -0,0 +1,347 @@
+"""
+Offline replacement for the Tailwind CDN script.
+
+Scans templates/ for class names and generates minified CSS for just the
+utilities that are used, with Tailwind v3 values, in Tailwind's cascade order
+(base utilities, then hover/focus variants, then sm/md/lg breakpoints).
+No network access or Node toolchain is needed. The output goes to
+static/css/app.css, which is committed; the deploy build (build_files.sh)
+checks it is current and runs collectstatic, whose manifest storage gives it
+a content-hashed name in STATIC_ROOT.
+
+Only the utility families the templates use are implemented. `build_css`
+reports any class it doesn't recognise, so adding a new family is a matter of
+adding one rule below.
+"""
+from django.conf import settings
+from pathlib import Path
+import re
+
+SPACING_UNIT = 0.25  # rem per step: p-4 = 1rem
+
+COLORS = {
+    "white": "#fff", "black": "#000", "transparent": "transparent",
+    "slate": {
+        "50": "#f8fafc", "100": "#f1f5f9", "200": "#e2e8f0", "300": "#cbd5e1", "400": "#94a3b8",
+        "500": "#64748b", "600": "#475569", "700": "#334155", "800": "#1e293b", "900": "#0f172a", "950": "#020617",
+    },
+    "emerald": {
+        "50": "#ecfdf5", "100": "#d1fae5", "200": "#a7f3d0", "300": "#6ee7b7", "400": "#34d399",
+        "500": "#10b981", "600": "#059669", "700": "#047857", "800": "#065f46", "900": "#064e3b", "950": "#022c22",
+    },
+    "red": {
+        "50": "#fef2f2", "100": "#fee2e2", "200": "#fecaca", "300": "#fca5a5", "400": "#f87171",
+        "500": "#ef4444", "600": "#dc2626", "700": "#b91c1c", "800": "#991b1b", "900": "#7f1d1d", "950": "#450a0a",
+    },
+}
+
+FONT_SIZES = {
+    "xs": ("0.75rem", "1rem"), "sm": ("0.875rem", "1.25rem"), "base": ("1rem", "1.5rem"),
+    "lg": ("1.125rem", "1.75rem"), "xl": ("1.25rem", "1.75rem"), "2xl": ("1.5rem", "2rem"),
+    "3xl": ("1.875rem", "2.25rem"), "4xl": ("2.25rem", "2.5rem"),
+}
+FONT_WEIGHTS = {"normal": "400", "medium": "500", "semibold": "600", "bold": "700"}
+MAX_WIDTHS = {
+    "xs": "20rem", "sm": "24rem", "md": "28rem", "lg": "32rem", "xl": "36rem", "2xl": "42rem",
+    "3xl": "48rem", "4xl": "56rem", "5xl": "64rem", "6xl": "72rem", "7xl": "80rem", "full": "100%",
+}
+RADII = {"": "0.25rem", "none": "0", "sm": "0.125rem", "md": "0.375rem", "lg": "0.5rem",
+         "xl": "0.75rem", "2xl": "1rem", "3xl": "1.5rem", "full": "9999px"}
+SHADOWS = {
+    "": "0 1px 3px 0 rgb(0 0 0/.1),0 1px 2px -1px rgb(0 0 0/.1)",
+    "md": "0 4px 6px -1px rgb(0 0 0/.1),0 2px 4px -2px rgb(0 0 0/.1)",
+    "lg": "0 10px 15px -3px rgb(0 0 0/.1),0 4px 6px -4px rgb(0 0 0/.1)",
+    "xl": "0 20px 25px -5px rgb(0 0 0/.1),0 8px 10px -6px rgb(0 0 0/.1)",
+    "inner": "inset 0 2px 4px 0 rgb(0 0 0/.05)",
+    "none": "0 0 #0000",
+}
+SCREENS = {"sm": "640px", "md": "768px", "lg": "1024px", "xl": "1280px"}
+
+# pseudo-class / pseudo-element variants, in the order Tailwind emits them
+VARIANTS = {
+    "file": "::file-selector-button",
+    "placeholder": "::placeholder",
+    "hover": ":hover",
+    "focus": ":focus",
+}
+
+STATIC_DECLS = {
+    "block": "display:block", "inline-block": "display:inline-block", "flex": "display:flex",
+    "inline-flex": "display:inline-flex", "grid": "display:grid", "hidden": "display:none",
+    "fixed": "position:fixed", "absolute": "position:absolute", "relative": "position:relative",
+    "flex-1": "flex:1 1 0%", "flex-col": "flex-direction:column", "flex-row": "flex-direction:row",
+    "flex-wrap": "flex-wrap:wrap", "shrink-0": "flex-shrink:0",
+    "items-center": "align-items:center", "items-start": "align-items:flex-start",
+    "justify-start": "justify-content:flex-start", "justify-center": "justify-content:center",
+    "justify-between": "justify-content:space-between", "justify-end": "justify-content:flex-end",
+    "col-span-full": "grid-column:1/-1",
+    "overflow-hidden": "overflow:hidden",
+    "object-contain": "object-fit:contain", "object-cover": "object-fit:cover",
+    "min-h-screen": "min-height:100vh", "h-full": "height:100%", "w-full": "width:100%", "w-auto": "width:auto",
+    "mx-auto": "margin-left:auto;margin-right:auto", "mt-auto": "margin-top:auto",
+    "text-left": "text-align:left", "text-center": "text-align:center", "text-right": "text-align:right",
+    "uppercase": "text-transform:uppercase", "underline": "text-decoration-line:underline",
+    "tracking-wide": "letter-spacing:.025em",
+    "border": "border-width:1px", "border-0": "border-width:0px", "border-t": "border-top-width:1px",
+    "transition": (
+        "transition-property:color,background-color,border-color,text-decoration-color,fill,stroke,"
+        "opacity,box-shadow,transform,filter,backdrop-filter;"
+        "transition-timing-function:cubic-bezier(.4,0,.2,1);transition-duration:.15s"
+    ),
+}
+
+# cascade group of each STATIC_DECLS entry, by its first property
+_STATIC_GROUPS = {
+    "display": "display", "position": "position", "grid-column": "grid-column",
+    "flex": "flex", "flex-direction": "flex", "flex-wrap": "flex", "flex-shrink": "flex",
+    "align-items": "flex", "justify-content": "flex", "overflow": "overflow", "object-fit": "object",
+    "min-height": "size", "height": "size", "width": "size",
+    "margin-left": "margin-axis", "margin-top": "margin-side",
+    "text-align": "text-align", "text-transform": "text-transform", "text-decoration-line": "decoration",
+    "letter-spacing": "tracking", "border-width": "border-width", "border-top-width": "border-width",
+    "transition-property": "transition",
+}
+
+# Tailwind-ish cascade order of utility groups; later groups win ties
+GROUP_ORDER = [
+    "position", "inset", "grid-column", "margin", "margin-axis", "margin-side", "display", "aspect",
+    "size", "flex", "grid", "gap", "space", "overflow", "radius", "border-width", "border-color",
+    "background", "object", "padding", "padding-axis", "padding-side", "text-align", "font-size",
+    "font-weight", "text-transform", "tracking", "color", "decoration", "placeholder", "accent",
+    "shadow", "outline", "ring", "ring-color", "transition", "transform",
+]
+
+
+def _spacing(value):
+    if value == "auto":
+        return "auto"
+    if value == "px":
+        return "1px"
+    if re.fullmatch(r"\d+(\.\d+)?", value):
+        rem = float(value) * SPACING_UNIT
+        return "0px" if rem == 0 else f"{rem:g}rem"
+    return None
+
+def _arbitrary(value):
+    """[480px] / [#A88D8D] / [3/4] → raw value."""
+    if value.startswith("[") and value.endswith("]"):
+        return value[1:-1].replace("_", " ")
+    return None
+
+def _color(value):
+    raw = _arbitrary(value)
+    if raw is not None:
+        return raw
+    if value in COLORS and isinstance(COLORS[value], str):
+        return COLORS[value]
+    family, _, shade = value.rpartition("-")
+    if family in COLORS and isinstance(COLORS[family], dict):
+        return COLORS[family].get(shade)
+    return None
+
+def utility_rule(name):
+    """(group, declarations, selector suffix) for a bare utility, or None if unknown."""
+    if name in STATIC_DECLS:
+        decls = STATIC_DECLS[name]
+        return _STATIC_GROUPS[decls.split(":", 1)[0]], decls, ""
+
+    if name == "outline-none":
+        return "outline", "outline:2px solid transparent;outline-offset:2px", ""
+
+    m = re.fullmatch(r"(p|px|py|pt|pr|pb|pl|m|mx|my|mt|mr|mb|ml)-(.+)", name)
+    if m:
+        prop = "padding" if m.group(1)[0] == "p" else "margin"
+        value = _spacing(m.group(2)) or _arbitrary(m.group(2))
+        if value is None:
+            return None
+        side = m.group(1)[1:]
+        if not side:
+            return prop, f"{prop}:{value}", ""
+        if side in ("x", "y"):
+            a, b = ("left", "right") if side == "x" else ("top", "bottom")
+            return f"{prop}-axis", f"{prop}-{a}:{value};{prop}-{b}:{value}", ""
+        full = {"t": "top", "r": "right", "b": "bottom", "l": "left"}[side]
+        return f"{prop}-side", f"{prop}-{full}:{value}", ""
+
+    m = re.fullmatch(r"(top|right|bottom|left)-(.+)", name)
+    if m:
+        value = _spacing(m.group(2)) or _arbitrary(m.group(2))
+        return ("inset", f"{m.group(1)}:{value}", "") if value else None
+
+    m = re.fullmatch(r"(w|h|max-w|max-h|min-w|min-h)-(.+)", name)
+    if m:
+        prop = {"w": "width", "h": "height", "max-w": "max-width", "max-h": "max-height",
+                "min-w": "min-width", "min-h": "min-height"}[m.group(1)]
+        raw = m.group(2)
+        value = _arbitrary(raw) or (MAX_WIDTHS.get(raw) if m.group(1) == "max-w" else _spacing(raw))
+        return ("size", f"{prop}:{value}", "") if value else None
+
+    m = re.fullmatch(r"gap(-[xy])?-(.+)", name)
+    if m:
+        value = _spacing(m.group(2))
+        prop = {None: "gap", "-x": "column-gap", "-y": "row-gap"}[m.group(1)]
+        return ("gap", f"{prop}:{value}", "") if value else None
+
+    m = re.fullmatch(r"space-y-(.+)", name)
+    if m:
+        value = _spacing(m.group(1))
+        if not value:
+            return None
+        return "space", f"margin-top:{value}", ">:not([hidden])~:not([hidden])"
+
+    m = re.fullmatch(r"grid-cols-(\d+)", name)
+    if m:
+        return "grid", f"grid-template-columns:repeat({m.group(1)},minmax(0,1fr))", ""
+
+    m = re.fullmatch(r"aspect-(.+)", name)
+    if m:
+        value = _arbitrary(m.group(1)) or {"square": "1/1", "video": "16/9"}.get(m.group(1))
+        return ("aspect", f"aspect-ratio:{value}", "") if value else None
+
+    m = re.fullmatch(r"rounded(?:-(.+))?", name)
+    if m:
+        value = RADII.get(m.group(1) or "")
+        return ("radius", f"border-radius:{value}", "") if value else None
+
+    m = re.fullmatch(r"shadow(?:-(.+))?", name)
+    if m:
+        value = SHADOWS.get(m.group(1) or "")
+        return ("shadow", f"box-shadow:{value}", "") if value else None
+
+    m = re.fullmatch(r"ring-(\d+)", name)
+    if m:
+        return "ring", f"box-shadow:0 0 0 {m.group(1)}px var(--tw-ring-color,rgb(59 130 246/.5))", ""
+
+    m = re.fullmatch(r"font-(.+)", name)
+    if m and m.group(1) in FONT_WEIGHTS:
+        return "font-weight", f"font-weight:{FONT_WEIGHTS[m.group(1)]}", ""
+
+    m = re.fullmatch(r"scale-(\d+)", name)
+    if m:
+        return "transform", f"transform:scale({int(m.group(1)) / 100:g})", ""
+
+    m = re.fullmatch(r"(text|bg|border|ring|placeholder|accent)-(.+)", name)
+    if m:
+        kind, value = m.groups()
+        if kind == "text" and value in FONT_SIZES:
+            size, line_height = FONT_SIZES[value]
+            return "font-size", f"font-size:{size};line-height:{line_height}", ""
+        color = _color(value)
+        if color is None:
+            return None
+        return {
+            "text": ("color", f"color:{color}", ""),
+            "bg": ("background", f"background-color:{color}", ""),
+            "border": ("border-color", f"border-color:{color}", ""),
+            "ring": ("ring-color", f"--tw-ring-color:{color}", ""),
+            "placeholder": ("placeholder", f"color:{color}", "::placeholder"),
+            "accent": ("accent", f"accent-color:{color}", ""),
+        }[kind]
+
+    return None
+
+
+def _escape(class_name):
+    return re.sub(r"([^a-zA-Z0-9_-])", r"\\\1", class_name)
+
+def compile_class(class_name):
+    """(screen, variant rank, group rank, css rule) for one class, or None if unknown."""
+    *variants, utility = class_name.split(":")
+    screen = None
+    pseudo_classes, pseudo_elements = [], []
+    variant_rank = 0
+    for variant in variants:
+        if variant in SCREENS and screen is None:
+            screen = variant
+        elif variant in VARIANTS:
+            target = pseudo_elements if VARIANTS[variant].startswith("::") else pseudo_classes
+            target.append(VARIANTS[variant])
+            variant_rank = max(variant_rank, list(VARIANTS).index(variant) + 1)
+        else:
+            return None
+
+    rule = utility_rule(utility)
+    if rule is None:
+        return None
+    group, decls, suffix = rule
+    if suffix.startswith("::"):
+        pseudo_elements.append(suffix)
+        suffix = ""
+
+    # .hover\:file\:x:hover::file-selector-button — pseudo-classes before pseudo-elements
+    selector = f".{_escape(class_name)}{''.join(pseudo_classes)}{suffix}{''.join(pseudo_elements)}"
+    return screen, variant_rank, GROUP_ORDER.index(group), f"{selector}{{{decls}}}"
+
+
+# Condensed Tailwind preflight, so pages look the same as with the CDN build
+PREFLIGHT = (
+    "*,::after,::before{box-sizing:border-box;border:0 solid #e5e7eb}"
+    "html{line-height:1.5;-webkit-text-size-adjust:100%;tab-size:4;"
+    "font-family:ui-sans-serif,system-ui,sans-serif,\"Apple Color Emoji\",\"Segoe UI Emoji\"}"
+    "body{margin:0;line-height:inherit}"
+    "hr{height:0;color:inherit;border-top-width:1px}"
+    "h1,h2,h3,h4,h5,h6{font-size:inherit;font-weight:inherit}"
+    "a{color:inherit;text-decoration:inherit}"
+    "b,strong{font-weight:bolder}"
+    "button,input,optgroup,select,textarea{font-family:inherit;font-size:100%;font-weight:inherit;"
+    "line-height:inherit;color:inherit;margin:0;padding:0}"
+    "button,select{text-transform:none}"
+    "[type=button],[type=reset],[type=submit],button{-webkit-appearance:button;background-color:transparent;"
+    "background-image:none}"
+    "blockquote,dd,dl,figure,h1,h2,h3,h4,h5,h6,hr,p,pre{margin:0}"
+    "fieldset{margin:0;padding:0}legend{padding:0}menu,ol,ul{list-style:none;margin:0;padding:0}"
+    "textarea{resize:vertical}"
+    "input::placeholder,textarea::placeholder{opacity:1;color:#9ca3af}"
+    "[role=button],button{cursor:pointer}"
+    "audio,canvas,embed,iframe,img,object,svg,video{display:block;vertical-align:middle}"
+    "img,video{max-width:100%;height:auto}[hidden]{display:none}"
+)
+
+_CLASS_ATTR = re.compile(r"""class\s*=\s*(["'])(.*?)\1""", re.S)
+_TEMPLATE_TAG = re.compile(r"\{%.*?%\}|\{\{.*?\}\}|\{#.*?#\}", re.S)
+
+
+def template_dirs():
+    return [Path(d) for d in settings.TEMPLATES[0]["DIRS"]] + [Path(settings.BASE_DIR) / "core" / "templates"]
+
+def scan_classes(dirs=None):
+    """Every class name used in a class="..." attribute under the template dirs."""
+    found = set()
+    for directory in dirs or template_dirs():
+        if not directory.is_dir():
+            continue
+        for path in sorted(directory.rglob("*.html")):
+            for _, value in _CLASS_ATTR.findall(path.read_text(encoding="utf-8")):
+                # template tags inside the attribute ({% if %}…) only switch between class names
+                found.update(_TEMPLATE_TAG.sub(" ", value).split())
+    return found
+
+def build_css(class_names):
+    """Return (minified css, sorted list of unknown class names)."""
+    compiled, unknown = [], []
+    for name in sorted(class_names):
+        result = compile_class(name)
+        if result is None:
+            unknown.append(name)
+        else:
+            compiled.append(result)
+
+    screens = [None] + list(SCREENS)
+    compiled.sort(key=lambda r: (screens.index(r[0]), r[1], r[2], r[3]))
+
+    out = [PREFLIGHT]
+    current_screen = None
+    for screen, _, _, css in compiled:
+        if screen != current_screen:
+            if current_screen is not None:
+                out.append("}")
+            if screen is not None:
+                out.append(f"@media (min-width:{SCREENS[screen]}){{")
+            current_screen = screen
+        out.append(css)
+    if current_screen is not None:
+        out.append("}")
+    return "".join(out), unknown
+
+def css_output_path() -> Path:
+    return Path(settings.BASE_DIR) / "static" / "css" / "app.css"
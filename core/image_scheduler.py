@@ -0,0 +1,201 @@
+"""
+Local scheduler for `client.images.edit` calls.
+
+Keeps this process under the image API's limits instead of finding out from
+"rate limit" errors afterwards:
+
+- token buckets for requests/minute and (estimated) image tokens/minute,
+- one queue per priority (first renders before high-quality upgrades),
+- round-robin between sessions inside a priority, so one user clicking
+  through outfits can't starve the others,
+- load shedding: if the estimated queue wait is longer than the caller's
+  deadline, `acquire` returns False right away and the view falls back.
+
+Budgets and priorities are per process: with N workers, set IMAGE_API_RPM /
+IMAGE_API_TPM to the account limit divided by N. `manage.py prerender_tryons`
+is a process of its own that neither yields to nor shares a budget with the
+web workers, so it takes an explicit share (--rpm / --tpm) that has to be
+left out of theirs while it runs.
+"""
+from collections import OrderedDict, deque
+from django.conf import settings
+import threading
+import time
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# gpt-image-1 output tokens per image by (quality, size)
+IMAGE_OUTPUT_TOKENS = {
+    ("low", "1024x1024"): 272, ("low", "1024x1536"): 408, ("low", "1536x1024"): 400,
+    ("medium", "1024x1024"): 1056, ("medium", "1024x1536"): 1584, ("medium", "1536x1024"): 1568,
+    ("high", "1024x1024"): 4160, ("high", "1024x1536"): 6240, ("high", "1536x1024"): 6208,
+}
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def estimate_image_tokens(quality, size):
+    return IMAGE_OUTPUT_TOKENS.get((quality, size), IMAGE_OUTPUT_TOKENS[("high", "1024x1536")])
+
+
+class TokenBucket:
+    """`rate_per_minute` tokens per minute, holding at most `capacity`. A rate of 0 means unlimited."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self):
+        return self.rate <= 0
+
+    def refill(self, now):
+        if not self.unlimited:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, cost):
+        """Seconds until one call costing `cost` tokens may go (0 if it may now)."""
+        if self.unlimited or self.tokens >= cost:
+            return 0.0
+        return (min(cost, self.capacity) - self.tokens) / self.rate
+
+    def backlog_wait(self, cost):
+        """Seconds until `cost` tokens in total have been available, for a queue of calls."""
+        if self.unlimited or self.tokens >= cost:
+            return 0.0
+        # not capped at capacity: the bucket refills while the queue drains
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost):
+        if not self.unlimited:
+            self.tokens -= min(cost, self.capacity)
+
+
+class _Ticket:
+    __slots__ = ("session_key", "cost")
+
+    def __init__(self, session_key, cost):
+        self.session_key = session_key
+        self.cost = cost
+
+
+class ImageAPIScheduler:
+    def __init__(self, requests_per_minute, tokens_per_minute=0, default_max_wait=20.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.default_max_wait = default_max_wait
+        self._cond = threading.Condition()
+        # priority -> OrderedDict(session_key -> deque of tickets); dict order is the round-robin order
+        self._queues = {PRIORITY_INTERACTIVE: OrderedDict(), PRIORITY_BACKGROUND: OrderedDict()}
+
+    # ----- queue bookkeeping (call with self._cond held) -----
+    def _head(self):
+        for priority in sorted(self._queues):
+            sessions = self._queues[priority]
+            if sessions:
+                session_key, tickets = next(iter(sessions.items()))
+                return priority, session_key, tickets[0]
+        return None
+
+    def _remove(self, priority, ticket):
+        sessions = self._queues[priority]
+        tickets = sessions.get(ticket.session_key)
+        if not tickets:
+            return
+        tickets.remove(ticket)
+        if not tickets:
+            del sessions[ticket.session_key]
+
+    def _grant(self, priority, ticket):
+        sessions = self._queues[priority]
+        tickets = sessions.pop(ticket.session_key)
+        tickets.popleft()
+        if tickets:
+            # this session goes to the back of the round-robin
+            sessions[ticket.session_key] = tickets
+        self.requests.take(1)
+        self.tokens.take(ticket.cost)
+
+    def _bucket_wait(self, cost):
+        return max(self.requests.wait_for(1), self.tokens.wait_for(cost))
+
+    def _estimated_wait(self, priority, cost):
+        """Rough wait for a new ticket: everything at the same or higher priority goes first."""
+        ahead_requests, ahead_tokens = 1, cost
+        for p, sessions in self._queues.items():
+            if p <= priority:
+                for tickets in sessions.values():
+                    ahead_requests += len(tickets)
+                    ahead_tokens += sum(min(t.cost, self.tokens.capacity) for t in tickets)
+        return max(self.requests.backlog_wait(ahead_requests), self.tokens.backlog_wait(ahead_tokens))
+
+    # ----- public -----
+    def acquire(self, session_key=None, priority=PRIORITY_INTERACTIVE, cost=0, max_wait=None):
+        """
+        Block until this call may hit the image API. Returns False (without
+        waiting) when the queue is too long for `max_wait` seconds, or if the
+        wait runs out. `max_wait=None` uses the default; background callers
+        can pass float("inf").
+        """
+        if max_wait is None:
+            max_wait = self.default_max_wait
+        ticket = _Ticket(session_key or "anonymous", cost)
+
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            if self._estimated_wait(priority, cost) > max_wait:
+                return False
+
+            self._queues[priority].setdefault(ticket.session_key, deque()).append(ticket)
+            deadline = now + max_wait
+            while True:
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                head = self._head()
+                if head and head[2] is ticket and self._bucket_wait(cost) == 0:
+                    self._grant(priority, ticket)
+                    self._cond.notify_all()
+                    return True
+                if now >= deadline:
+                    self._remove(priority, ticket)
+                    self._cond.notify_all()
+                    return False
+
+                timeout = deadline - now
+                if head and head[2] is ticket:
+                    timeout = min(timeout, self._bucket_wait(cost))
+                elif head:
+                    # someone else is first; wake up when they could be served
+                    timeout = min(timeout, max(self._bucket_wait(head[2].cost), 0.05))
+                self._cond.wait(timeout)
+
+
+def get_image_scheduler():
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = ImageAPIScheduler(
+                requests_per_minute=getattr(settings, "IMAGE_API_RPM", 20),
+                tokens_per_minute=getattr(settings, "IMAGE_API_TPM", 0),
+                default_max_wait=getattr(settings, "IMAGE_API_MAX_QUEUE_WAIT", 20.0),
+            )
+        return _SCHEDULER
+
+def configure_image_scheduler(requests_per_minute, tokens_per_minute=0):
+    """Give this process its own budget instead of IMAGE_API_RPM / IMAGE_API_TPM (offline commands)."""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        _SCHEDULER = ImageAPIScheduler(
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            default_max_wait=getattr(settings, "IMAGE_API_MAX_QUEUE_WAIT", 20.0),
+        )
+        return _SCHEDULER
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.assets import asset_manifest_path, build_asset_manifest, write_asset_manifest
+import json
+
+
+class Command(BaseCommand):
+    help = "Describe every product/garment/outfit/model image into core/data/asset_manifest.json."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Don't write; fail if the committed manifest doesn't match the images on disk.",
+        )
+
+    def handle(self, *args, **options):
+        manifest = build_asset_manifest()
+        if options["check"]:
+            try:
+                with asset_manifest_path().open(encoding="utf-8") as f:
+                    committed = json.load(f)
+            except (OSError, ValueError):
+                committed = None
+            if committed != manifest:
+                stale = sorted(rel for rel in manifest.keys() | (committed or {}).keys()
+                               if (committed or {}).get(rel) != manifest.get(rel))
+                raise CommandError(
+                    f"{asset_manifest_path()} is out of date ({len(stale)} changed: {', '.join(stale[:10])}); "
+                    "run `manage.py build_asset_manifest` and commit it."
+                )
+            self.stdout.write(self.style.SUCCESS(f"{asset_manifest_path()} is up to date."))
+            return
+
+        out = write_asset_manifest(manifest)
+        total = sum(entry["size"] for entry in manifest.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(manifest)} assets ({total / 1e6:.1f} MB) to {out}"
+        ))
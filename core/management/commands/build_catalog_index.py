@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.catalog_db import rebuild_catalog_index
+from core.views import get_catalog_version, read_products_file
+
+
+class Command(BaseCommand):
+    help = "(Re)build the sqlite/FTS5 product index used when CATALOG_BACKEND = 'sqlite'."
+
+    def handle(self, *args, **options):
+        version = get_catalog_version()
+        count = rebuild_catalog_index(read_products_file(), version)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products (catalog version {version})."))
@@ -0,0 +1,28 @@
+import json
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from core.categories import build_category_index, write_category_index
+from core.views import get_catalog_version, products_data_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Classify the products into categories once for this catalog version and write "
+        "core/data/category_index.json (category per product, name-sorted rows per category)."
+    )
+
+    def handle(self, *args, **options):
+        with products_data_path().open(encoding="utf-8") as f:
+            products = json.load(f)
+
+        version = get_catalog_version()
+        index = build_category_index(products, version)
+        out = write_category_index(index)
+
+        counts = Counter(c or "uncategorized" for c in index["categories"])
+        summary = ", ".join(f"{name}: {n}" for name, n in sorted(counts.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(products)} products ({summary}, catalog version {version}) to {out}"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.compact_catalog import write_compact_catalog
+from core.views import get_catalog_version, read_products_file
+
+
+class Command(BaseCommand):
+    help = "Write the columnar catalog file that workers mmap when CATALOG_BACKEND = 'compact'."
+
+    def handle(self, *args, **options):
+        version = get_catalog_version()
+        products = read_products_file()
+        out, size = write_compact_catalog(products, version)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(products)} products ({size / 1024:.1f} KB, catalog version {version}) to {out}"
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.css_build import build_css, css_output_path, scan_classes
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile the Tailwind classes used in templates/ into a purged, minified "
+        "static/css/app.css (no network needed). collectstatic then gives it a hashed name."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--strict", action="store_true", help="Fail if a class can't be compiled.")
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Don't write; fail if static/css/app.css differs from what would be written.",
+        )
+
+    def handle(self, *args, **options):
+        classes = scan_classes()
+        css, unknown = build_css(classes)
+
+        if unknown:
+            message = f"No rule for {len(unknown)} class(es): {', '.join(unknown)}"
+            if options["strict"]:
+                raise CommandError(message)
+            self.stderr.write(message)
+
+        out = css_output_path()
+        if options["check"]:
+            if not out.is_file() or out.read_text(encoding="utf-8") != css:
+                raise CommandError(f"{out} is out of date with the templates; run `manage.py build_css` and commit it.")
+            self.stdout.write(self.style.SUCCESS(f"{out} is up to date."))
+            return
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(css, encoding="utf-8")
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(classes) - len(unknown)} utilities ({len(css) / 1024:.1f} KB) to {out}"
+        ))
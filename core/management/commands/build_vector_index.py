@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.vectors import write_vector_index
+from core.views import get_catalog_version, load_outfits, read_products_file
+
+
+class Command(BaseCommand):
+    help = "Build the TF-IDF / LSH recommendation index into core/data/vector_index.bin."
+
+    def handle(self, *args, **options):
+        version = get_catalog_version()
+        products = read_products_file()
+        out, size = write_vector_index(products, load_outfits(), version)
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(products)} products ({size / 1024:.1f} KB, catalog version {version}) to {out}"
+        ))
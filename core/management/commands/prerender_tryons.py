@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from core.assets import asset_fs_path, get_garment_asset
+from core.categories import outfit_slot
+from core.image_scheduler import PRIORITY_BACKGROUND, configure_image_scheduler
+from core.views import (
+    DEFAULT_MODEL_URLS,
+    generate_tryon_image_with_openai,
+    load_products,
+    prerendered_combo_key,
+    prerendered_manifest_path,
+    resolve_image_path_from_url,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Render every top x bottom combination on the default models and record "
+        "them in core/data/prerendered_tryons.json. Renders go to static/prerendered/ and are "
+        "collected into STATIC_ROOT, which is what /static/ serves. Re-running resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent image API calls.")
+        parser.add_argument(
+            "--rpm",
+            type=int,
+            required=True,
+            help="Image API requests/minute for this run. It is separate from the web workers' "
+                 "IMAGE_API_RPM and doesn't yield to them: lower theirs by the same amount while it runs.",
+        )
+        parser.add_argument("--tpm", type=int, default=0, help="Image tokens/minute for this run (0: no limit).")
+        parser.add_argument(
+            "--models",
+            nargs="+",
+            choices=sorted(DEFAULT_MODEL_URLS),
+            default=sorted(DEFAULT_MODEL_URLS),
+            help="Which default models to render for.",
+        )
+        parser.add_argument("--limit", type=int, default=None, help="Render at most N combos (for trial runs).")
+        parser.add_argument("--force", action="store_true", help="Re-render combos already in the manifest.")
+        parser.add_argument("--dry-run", action="store_true", help="Only list what would be rendered.")
+        parser.add_argument(
+            "--no-collectstatic",
+            action="store_true",
+            help="Don't run collectstatic afterwards (e.g. when the deploy build runs it).",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
+        if options["rpm"] < 1:
+            raise CommandError("--rpm must be at least 1")
+
+        products = load_products()
+        tops = [p for p in products if outfit_slot(p.get("category")) == "top"]
+        bottoms = [p for p in products if outfit_slot(p.get("category")) == "bottom"]
+
+        static_dir = Path(settings.BASE_DIR) / "static"
+        manifest_path = prerendered_manifest_path()
+        manifest = {}
+        if manifest_path.exists():
+            with manifest_path.open(encoding="utf-8") as f:
+                manifest = json.load(f)
+
+        jobs = []
+        skipped_missing = 0
+        for gender in options["models"]:
+            model_url = DEFAULT_MODEL_URLS[gender]
+            model_path = resolve_image_path_from_url(model_url)
+            model_key = Path(model_url).stem
+            done = manifest.get(model_key, {})
+
+            for top in tops:
+                for bottom in bottoms:
+                    combo = prerendered_combo_key(top["id"], bottom["id"])
+                    garments = [get_garment_asset(p["id"]) for p in (top, bottom)]
+                    if not all(garments):
+                        skipped_missing += 1
+                        continue
+                    garments = [asset_fs_path(g) for g in garments]
+                    # resume: keep combos whose image is still on disk
+                    if not options["force"] and combo in done and (static_dir / done[combo]).exists():
+                        continue
+                    jobs.append((model_key, model_path, combo, garments))
+
+        if options["limit"] is not None:
+            jobs = jobs[:options["limit"]]
+
+        self.stdout.write(
+            f"{len(jobs)} combos to render ({skipped_missing} skipped: missing nano garment image)."
+        )
+        if options["dry_run"] or not jobs:
+            return
+
+        rendered = failed = 0
+        configure_image_scheduler(options["rpm"], options["tpm"])
+
+        def render_one(job):
+            model_key, model_path, combo, garments = job
+            # offline run: wait as long as the --rpm budget needs, no deadline
+            media_url, err = generate_tryon_image_with_openai(
+                model_path, garments, session_key="prerender", priority=PRIORITY_BACKGROUND,
+                max_wait=float("inf"),
+            )
+            if not media_url:
+                return None, err
+
+            rel = f"prerendered/{model_key}/{combo.replace('+', '_')}.png"
+            target = static_dir / rel
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # copy: live sessions may still point at the tryon/<key>_<quality>.png cache file
+            shutil.copy2(resolve_image_path_from_url(media_url), target)
+            return rel, None
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = {pool.submit(render_one, job): job for job in jobs}
+            for future in as_completed(futures):
+                model_key, _, combo, _ = futures[future]
+                try:
+                    rel, err = future.result()
+                except Exception as e:
+                    rel, err = None, str(e)
+
+                if not rel:
+                    failed += 1
+                    self.stderr.write(f"[{model_key}] {combo}: {err}")
+                    continue
+
+                manifest.setdefault(model_key, {})[combo] = rel
+                # write after every render so an interrupted run can resume
+                tmp_path = manifest_path.with_suffix(".json.tmp")
+                with tmp_path.open("w", encoding="utf-8") as f:
+                    json.dump(manifest, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, manifest_path)
+                rendered += 1
+                self.stdout.write(f"[{model_key}] {combo} -> {rel}")
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} combos, {failed} failed."))
+
+        # static/prerendered/ is only a source dir: the files are served (and
+        # {% static %} resolves their hashed names) once they are in STATIC_ROOT
+        if rendered:
+            # the renders are assets too; commit the updated manifest with them
+            call_command("build_asset_manifest", stdout=self.stdout)
+        if rendered and not options["no_collectstatic"]:
+            call_command("collectstatic", interactive=False, verbosity=0)
+            self.stdout.write("Collected the renders into STATIC_ROOT.")
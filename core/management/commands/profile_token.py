@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import make_profile_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Print a signed token that makes the server profile one request to a core view "
+        "(send it as an X-Profile header or ?_profile=). Needs PROFILE_REQUESTS=1 and PROFILE_SECRET on the server."
+    )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "PROFILE_SECRET", ""):
+            raise CommandError(
+                "PROFILE_SECRET is not set. Set the same value here and on the server; "
+                "without it the server ignores profile tokens."
+            )
+        if not getattr(settings, "PROFILE_REQUESTS", False):
+            self.stderr.write("PROFILE_REQUESTS is off in this environment; the token is ignored until it is on.")
+        self.stdout.write(make_profile_token())
+        self.stderr.write(f"Valid for {getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 3600)}s.")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.warmup import run_warmup
+
+
+class Command(BaseCommand):
+    help = "Preload catalogs, indexes, templates and clients the way a cold start would, and time each step."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--strict", action="store_true", help="Exit non-zero if any step failed.")
+
+    def handle(self, *args, **options):
+        steps = run_warmup()
+        for step in steps:
+            line = f"{step['step']:<22} {step['ms']:>9.2f} ms"
+            if step["error"]:
+                self.stdout.write(self.style.WARNING(f"{line}  failed: {step['error']}"))
+            else:
+                self.stdout.write(line)
+        self.stdout.write(f"{'total':<22} {sum(s['ms'] for s in steps):>9.2f} ms")
+
+        failed = [s["step"] for s in steps if s["error"]]
+        if failed and options["strict"]:
+            raise CommandError(f"Warmup steps failed: {', '.join(failed)}")
@@ -0,0 +1,188 @@
+"""
+Opt-in profiling of live requests to the core views.
+
+With PROFILE_REQUESTS on, a request is profiled when it carries a signed
+token (`X-Profile` header or `?_profile=`, minted by `manage.py
+profile_token`) or falls in the PROFILE_SAMPLE_RATE fraction. Tokens are
+signed with PROFILE_SECRET, not SECRET_KEY (which has a public development
+default); without it, tokens are ignored. The profile
+goes to PROFILE_DIR as <id>.prof (cProfile, open with pstats / snakeviz) or
+<id>.html (pyinstrument, when installed and PROFILE_ENGINE="pyinstrument"),
+next to <id>.json with the URL, status, wall/CPU time, per-phase timings
+and the catalog version. The response names the profile in X-Profile-Id.
+
+Phases are the functions marked with @timed_phase (catalog scoring, Nosana,
+image calls); outside a profiled request the decorator only does a
+ContextVar lookup.
+"""
+from contextvars import ContextVar
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import Resolver404, resolve
+from django.utils.crypto import get_random_string
+from pathlib import Path
+import cProfile
+import functools
+import json
+import logging
+import random
+import threading
+import time
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN_SALT = "core.profiling"
+PROFILE_HEADER = "HTTP_X_PROFILE"
+PROFILE_PARAM = "_profile"
+
+# {phase: [calls, seconds]} while a request is being profiled, else None
+_PHASES = ContextVar("profile_phases", default=None)
+
+# one profiled request at a time per process: cProfile can't run in two
+# threads at once on 3.12+ (enable() raises ValueError); others go unprofiled
+_PROFILE_LOCK = threading.Lock()
+
+
+def timed_phase(name):
+    """Add the wrapped function's wall time to phase `name` of the profiled request, if any."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            phases = _PHASES.get()
+            if phases is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                entry = phases.setdefault(name, [0, 0.0])
+                entry[0] += 1
+                entry[1] += time.perf_counter() - start
+        return wrapper
+    return decorator
+
+def _token_signer():
+    secret = getattr(settings, "PROFILE_SECRET", "")
+    return signing.TimestampSigner(key=secret, salt=PROFILE_TOKEN_SALT) if secret else None
+
+def make_profile_token():
+    signer = _token_signer()
+    if signer is None:
+        raise ImproperlyConfigured("PROFILE_SECRET is not set.")
+    return signer.sign("profile")
+
+def has_valid_token(request):
+    signer = _token_signer()
+    token = request.META.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+    if signer is None or not token:
+        return False
+    try:
+        signer.unsign(
+            token, max_age=getattr(settings, "PROFILE_TOKEN_MAX_AGE", 3600)
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+def is_core_view(request):
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    return match.func.__module__ == "core.views"
+
+def should_profile(request):
+    if not getattr(settings, "PROFILE_REQUESTS", False):
+        return False
+    if has_valid_token(request):
+        return is_core_view(request)
+    rate = getattr(settings, "PROFILE_SAMPLE_RATE", 0.0)
+    return rate > 0 and random.random() < rate and is_core_view(request)
+
+def profile_dir() -> Path:
+    path = Path(getattr(settings, "PROFILE_DIR", "/tmp/stylemaxx-profiles"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class RequestProfilerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request):
+            return self.get_response(request)
+        if not _PROFILE_LOCK.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self.profile_request(request)
+        finally:
+            _PROFILE_LOCK.release()
+
+    def profile_request(self, request):
+        use_pyinstrument = pyinstrument is not None and getattr(settings, "PROFILE_ENGINE", "cprofile") == "pyinstrument"
+        if use_pyinstrument:
+            profiler = pyinstrument.Profiler()
+            start, stop = profiler.start, profiler.stop
+        else:
+            profiler = cProfile.Profile()
+            start, stop = profiler.enable, profiler.disable
+
+        try:
+            start()
+        except Exception:
+            # another profiler is active in this process (e.g. a debugger's)
+            logger.exception("Could not start the request profiler")
+            return self.get_response(request)
+
+        phases = {}
+        phases_token = _PHASES.set(phases)
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            response = self.get_response(request)
+        finally:
+            stop()
+            wall, cpu = time.perf_counter() - wall_start, time.thread_time() - cpu_start
+            _PHASES.reset(phases_token)
+
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{get_random_string(6)}"
+        try:
+            self.write_profile(request, response, profiler, use_pyinstrument, profile_id, wall, cpu, phases)
+        except Exception:
+            logger.exception("Could not write request profile %s", profile_id)
+            return response
+        response["X-Profile-Id"] = profile_id
+        return response
+
+    def write_profile(self, request, response, profiler, use_pyinstrument, profile_id, wall, cpu, phases):
+        from .views import get_catalog_version
+
+        out = profile_dir()
+        if use_pyinstrument:
+            profile_file = out / f"{profile_id}.html"
+            profile_file.write_text(profiler.output_html(), encoding="utf-8")
+        else:
+            profile_file = out / f"{profile_id}.prof"
+            profiler.dump_stats(profile_file)
+
+        meta = {
+            "id": profile_id,
+            "profile": profile_file.name,
+            "engine": "pyinstrument" if use_pyinstrument else "cprofile",
+            "method": request.method,
+            "url": request.get_full_path(),
+            "status": response.status_code,
+            "wall_ms": round(wall * 1000, 2),
+            "cpu_ms": round(cpu * 1000, 2),
+            "phases": {name: {"calls": calls, "ms": round(seconds * 1000, 2)} for name, (calls, seconds) in phases.items()},
+            "catalog_version": get_catalog_version(),
+            "catalog_backend": getattr(settings, "CATALOG_BACKEND", "json"),
+        }
+        with (out / f"{profile_id}.json").open("w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
@@ -0,0 +1,145 @@
+"""
+Reuse generated model images for selfies we have already seen.
+
+Every upload gets an exact hash (sha256 of the bytes) and a perceptual one
+(64-bit dHash of the orientation-corrected image). After a successful
+selfie → model render we record both with the gender, the uploading session
+(hashed) and the model file in MEDIA_ROOT/models/selfie_index.sqlite3. The next
+upload of the same bytes with the same gender gets that model back without
+an image API call; a re-encoded / resized copy (dHash within
+SELFIE_DHASH_MAX_DISTANCE bits) only does within the same session, since
+two different people's photos can be that close too.
+
+The index is a sqlite table keyed by (sha256, gender), so concurrent workers
+record through sqlite's own locking, exact lookups are a primary-key probe and
+near-duplicate lookups only look at the session's own rows. It keeps the
+SELFIE_INDEX_MAX_ENTRIES most recently recorded selfies.
+"""
+from django.conf import settings
+from PIL import Image, ImageOps
+from pathlib import Path
+from contextlib import contextmanager
+import hashlib
+import sqlite3
+
+DHASH_SIZE = 8
+
+
+def selfie_index_path() -> Path:
+    return Path(settings.MEDIA_ROOT) / "models" / "selfie_index.sqlite3"
+
+def normalize_gender(gender):
+    g = (gender or "person").lower()
+    return g if g in ("male", "female") else "person"
+
+def dhash(image: Image.Image):
+    """Difference hash: 64 bits of 'is this pixel brighter than its right neighbour' on a 9x8 thumbnail."""
+    small = image.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(DHASH_SIZE):
+        for col in range(DHASH_SIZE):
+            left = pixels[row * (DHASH_SIZE + 1) + col]
+            right = pixels[row * (DHASH_SIZE + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+def hash_upload(uploaded_file):
+    """
+    (sha256, dhash) of an uploaded image, leaving the file rewound for saving.
+    dhash is None when Pillow can't read it.
+    """
+    sha = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        sha.update(chunk)
+
+    uploaded_file.seek(0)
+    try:
+        with Image.open(uploaded_file) as img:
+            # JPEGs decode at reduced scale; a 9x8 thumbnail doesn't need the full photo
+            img.draft("L", (DHASH_SIZE * 16, DHASH_SIZE * 16))
+            perceptual = dhash(ImageOps.exif_transpose(img))
+    except Exception:
+        perceptual = None
+    uploaded_file.seek(0)
+    return sha.hexdigest(), perceptual
+
+def session_tag(session_id):
+    """What the index stores for a session: its id hashed, as the index sits under MEDIA_ROOT."""
+    return hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:16] if session_id else None
+
+def hamming(a, b):
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+@contextmanager
+def _connect():
+    path = selfie_index_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    try:
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS selfie_model ("
+                " sha256 TEXT NOT NULL,"
+                " gender TEXT NOT NULL,"
+                " dhash TEXT,"
+                " session TEXT,"
+                " model TEXT NOT NULL,"
+                " PRIMARY KEY (sha256, gender))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS selfie_model_session ON selfie_model (session, gender)"
+            )
+            yield conn
+    finally:
+        conn.close()
+
+def find_model_for_selfie(sha256, perceptual, gender, session_id=None):
+    """
+    MEDIA_URL of a model generated from this selfie (any session) or a
+    near-identical one (same session) with the same gender, or None.
+    """
+    gender = normalize_gender(gender)
+    max_distance = getattr(settings, "SELFIE_DHASH_MAX_DISTANCE", 6)
+    session = session_tag(session_id)
+    try:
+        with _connect() as conn:
+            row = conn.execute(
+                "SELECT model FROM selfie_model WHERE sha256 = ? AND gender = ?", (sha256, gender)
+            ).fetchone()
+            best = row[0] if row else None
+            if best is None and perceptual and session:
+                best_distance = None
+                for model, other in conn.execute(
+                    "SELECT model, dhash FROM selfie_model"
+                    " WHERE session = ? AND gender = ? AND dhash IS NOT NULL", (session, gender)
+                ):
+                    distance = hamming(perceptual, other)
+                    if distance <= max_distance and (best_distance is None or distance < best_distance):
+                        best, best_distance = model, distance
+    except sqlite3.Error:
+        return None
+
+    # the model file may have been cleaned up since
+    if best and (Path(settings.MEDIA_ROOT) / best).is_file():
+        return settings.MEDIA_URL + best
+    return None
+
+def record_selfie_model(sha256, perceptual, gender, model_url, session_id=None):
+    """Remember which generated model a selfie produced, and for which session."""
+    if not model_url.startswith(settings.MEDIA_URL):
+        return
+    max_entries = getattr(settings, "SELFIE_INDEX_MAX_ENTRIES", 10000)
+    try:
+        with _connect() as conn:
+            # REPLACE gives the row a fresh rowid, so rowid order is recording order
+            conn.execute(
+                "INSERT OR REPLACE INTO selfie_model (sha256, gender, dhash, session, model) VALUES (?, ?, ?, ?, ?)",
+                (sha256, normalize_gender(gender), perceptual, session_tag(session_id), model_url[len(settings.MEDIA_URL):]),
+            )
+            conn.execute(
+                "DELETE FROM selfie_model WHERE rowid NOT IN"
+                " (SELECT rowid FROM selfie_model ORDER BY rowid DESC LIMIT ?)", (max_entries,)
+            )
+    except sqlite3.Error:
+        pass
@@ -0,0 +1,160 @@
+"""
+Single-flight coalescing for the slow upstream calls (Nosana, image edits).
+
+Concurrent callers with the same canonical key share one upstream call:
+the first caller (the leader) runs it, everybody else waits for its result.
+
+Within a process this is a dict of in-flight calls. When
+SINGLE_FLIGHT_LOCK_DIR is set, the leader also holds an flock on
+<dir>/<key>.lock while it calls upstream and leaves its result in
+<dir>/<key>.json, so a leader in another worker process that was blocked on
+the same lock picks that result up (if younger than SINGLE_FLIGHT_RESULT_TTL)
+instead of calling upstream again.
+
+The leader unlinks the lock file before releasing it (a waiter that then
+gets the lock on the unlinked file notices and reopens the path), and
+result files older than the TTL are swept at most once per TTL per process,
+so the directory doesn't grow with every key ever seen.
+"""
+from django.conf import settings
+from functools import wraps
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not on POSIX: in-process coalescing only
+    fcntl = None
+
+_INFLIGHT = {}
+_INFLIGHT_LOCK = threading.Lock()
+_LAST_SWEEP = 0.0
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def canonical_key(namespace, *parts):
+    """Stable key for a request: namespace + sha256 of the JSON-encoded parts."""
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return f"{namespace}-{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]}"
+
+def _lock_dir():
+    lock_dir = getattr(settings, "SINGLE_FLIGHT_LOCK_DIR", "")
+    if not lock_dir or fcntl is None:
+        return None
+    path = Path(lock_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def _read_shared_result(result_path, ttl):
+    try:
+        if time.time() - result_path.stat().st_mtime > ttl:
+            return None
+        with result_path.open(encoding="utf-8") as f:
+            return tuple(json.load(f))
+    except (OSError, ValueError):
+        return None
+
+def _sweep_expired(lock_dir, ttl):
+    """Delete result (and leftover temp) files older than `ttl`, at most once per `ttl`."""
+    global _LAST_SWEEP
+    now = time.time()
+    if now - _LAST_SWEEP < ttl:
+        return
+    _LAST_SWEEP = now
+    for path in lock_dir.iterdir():
+        if path.suffix not in (".json", ".tmp"):
+            continue
+        try:
+            if now - path.stat().st_mtime > ttl:
+                path.unlink()
+        except OSError:
+            pass
+
+def _lock_path(lock_path):
+    """Open and flock `lock_path`; retry if the holder unlinked it meanwhile."""
+    while True:
+        lock_file = lock_path.open("a")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                return lock_file
+        except FileNotFoundError:
+            pass
+        lock_file.close()
+
+def _call_across_processes(key, fn, is_shareable):
+    lock_dir = _lock_dir()
+    if lock_dir is None:
+        return fn()
+
+    ttl = getattr(settings, "SINGLE_FLIGHT_RESULT_TTL", 120)
+    result_path = lock_dir / f"{key}.json"
+    lock_path = lock_dir / f"{key}.lock"
+    lock_file = _lock_path(lock_path)
+    try:
+        shared = _read_shared_result(result_path, ttl)
+        if shared is not None:
+            return shared
+
+        result = fn()
+        if is_shareable(result):
+            tmp_path = result_path.with_suffix(f".{os.getpid()}.tmp")
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(list(result), f)
+            os.replace(tmp_path, result_path)
+        _sweep_expired(lock_dir, ttl)
+        return result
+    finally:
+        lock_path.unlink(missing_ok=True)
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+def single_flight(key_func, is_shareable=lambda result: result[-1] is None):
+    """
+    Decorator: coalesce concurrent calls whose `key_func(*args, **kwargs)` match.
+    The wrapped functions return tuples whose last item is an error message;
+    only error-free results are handed to other processes.
+    A key of None disables coalescing for that call.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs)
+            if key is None:
+                return fn(*args, **kwargs)
+
+            with _INFLIGHT_LOCK:
+                call = _INFLIGHT.get(key)
+                leader = call is None
+                if leader:
+                    call = _INFLIGHT[key] = _Call()
+
+            if not leader:
+                call.done.wait()
+                if call.error is not None:
+                    raise call.error
+                return call.result
+
+            try:
+                call.result = _call_across_processes(key, lambda: fn(*args, **kwargs), is_shareable)
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with _INFLIGHT_LOCK:
+                    _INFLIGHT.pop(key, None)
+                call.done.set()
+
+        return wrapper
+    return decorator
@@ -0,0 +1,127 @@
+"""
+In-process static file server for deployments without a CDN in front
+(on Vercel, /static/ is routed to the build output before Django sees it).
+
+- serves files from STATIC_ROOT (collectstatic output),
+- content-hashed names get `Cache-Control: immutable` for a year, anything
+  else must revalidate,
+- picks the precompressed .br / .gz sibling when the client accepts it,
+- answers If-None-Match / If-Modified-Since with 304 and single
+  `Range: bytes=` requests with 206 (large outfit/product images, video seeking).
+"""
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+from pathlib import Path
+import mimetypes
+import re
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+# ManifestStaticFilesStorage names: <stem>.<12 hex chars>.<ext>
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^./]+$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _accepted_encodings(request):
+    header = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    return {part.split(";")[0].strip().lower() for part in header.split(",") if part.strip()}
+
+def _pick_variant(request, path: Path):
+    """(file to send, Content-Encoding or None)."""
+    accepted = _accepted_encodings(request)
+    for encoding, suffix in _ENCODINGS:
+        if encoding in accepted:
+            variant = path.with_name(path.name + suffix)
+            if variant.is_file():
+                return variant, encoding
+    return path, None
+
+def _parse_range(header, size):
+    """(start, end) inclusive for a single satisfiable byte range, None to ignore, False if unsatisfiable."""
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        # suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+def serve_static(request, path):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponse(status=405, headers={"Allow": "GET, HEAD"})
+
+    try:
+        fs_path = Path(safe_join(settings.STATIC_ROOT, path))
+    except Exception:
+        raise Http404("Invalid static path")
+    if not fs_path.is_file():
+        raise Http404(f"'{path}' does not exist")
+
+    stat = fs_path.stat()
+    range_header = request.META.get("HTTP_RANGE")
+    # ranges are served from the identity encoding only
+    send_path, encoding = (fs_path, None) if range_header else _pick_variant(request, fs_path)
+    # each encoding is a different body, so it gets its own validator
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+    cache_control = IMMUTABLE_CACHE_CONTROL if _HASHED_NAME.search(fs_path.name) else REVALIDATE_CACHE_CONTROL
+    headers = {
+        "Cache-Control": cache_control,
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if (if_none_match and etag in [t.strip() for t in if_none_match.split(",")]) or (
+        not if_none_match and request.META.get("HTTP_IF_MODIFIED_SINCE")
+        and not was_modified_since(request.META["HTTP_IF_MODIFIED_SINCE"], stat.st_mtime)
+    ):
+        response = HttpResponseNotModified()
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    content_type, _ = mimetypes.guess_type(fs_path.name)
+    content_type = content_type or "application/octet-stream"
+
+    if range_header:
+        byte_range = _parse_range(range_header, stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416, headers=headers)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            with fs_path.open("rb") as f:
+                f.seek(start)
+                body = f.read(end - start + 1) if request.method == "GET" else b""
+            response = HttpResponse(body, status=206, content_type=content_type, headers=headers)
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = str(end - start + 1)
+            response["Accept-Ranges"] = "bytes"
+            return response
+
+    response = FileResponse(
+        send_path.open("rb"), content_type=content_type, filename=fs_path.name, headers=headers
+    )
+    response["Accept-Ranges"] = "bytes"
+    if encoding:
+        response["Content-Encoding"] = encoding
+        response["Content-Length"] = str(send_path.stat().st_size)
+    return response
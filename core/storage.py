@@ -0,0 +1,105 @@
+"""
+Static files storage: content-hashed names (ManifestStaticFilesStorage) plus
+precompressed .gz / .br siblings for text assets, written at collectstatic time
+so neither the in-process static server nor a CDN has to compress per request.
+
+Brotli output needs the optional `brotli` package; without it only gzip is written.
+
+On Vercel collectstatic runs in the static build (build_files.sh), whose
+output, staticfiles.json included, is not part of the Python function's
+bundle. There the manifest is missing and hashed names are computed from the
+source files in static/ instead: collectstatic hashes the same bytes, so the
+names match what the static build uploaded. Files whose references
+collectstatic rewrites (CSS with url()/@import, like the admin's) would hash
+differently, so those keep their plain name, which is collected too.
+"""
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.contrib.staticfiles.utils import matches_patterns
+from django.core.files import File
+import gzip
+import logging
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_SUFFIXES = (".css", ".js", ".mjs", ".json", ".svg", ".txt", ".html", ".map", ".xml")
+
+# tiny files aren't worth a second request-time lookup
+MIN_COMPRESS_SIZE = 256
+
+logger = logging.getLogger(__name__)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._source_names = {}
+        self._source_lock = threading.Lock()
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            pass
+        if self.hashed_files:
+            # the manifest is there but stale: collectstatic wasn't re-run
+            logger.warning("%s is not in %s; serving it unhashed", name, self.manifest_name)
+            return name
+        return self.source_hashed_name(name)
+
+    def source_hashed_name(self, name):
+        """Hashed name computed from the static/ source file (once per name), or `name` if there is none."""
+        with self._source_lock:
+            if name in self._source_names:
+                return self._source_names[name]
+        path = finders.find(name.split("?", 1)[0].split("#", 1)[0])
+        if path is None:
+            hashed = name
+            logger.warning("No %s and no source file for %s; serving it unhashed", self.manifest_name, name)
+        elif self._has_references(path):
+            hashed = name
+        else:
+            with open(path, "rb") as f:
+                hashed = self.hashed_name(name, File(f))
+        with self._source_lock:
+            self._source_names[name] = hashed
+        return hashed
+
+    def _has_references(self, path):
+        """Whether collectstatic would rewrite references inside this file (changing its hash)."""
+        for extension, patterns in self._patterns.items():
+            if matches_patterns(path, (extension,)):
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    content = f.read()
+                if any(pattern.search(content) for pattern, _ in patterns):
+                    return True
+        return False
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and not isinstance(processed, Exception) and hashed_name:
+                self.write_compressed_variants(hashed_name)
+            yield name, hashed_name, processed
+
+    def write_compressed_variants(self, name):
+        if not name.lower().endswith(COMPRESSIBLE_SUFFIXES):
+            return
+        path = self.path(name)
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+
+        variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(data, quality=11)
+
+        for suffix, compressed in variants.items():
+            # only keep a variant that actually saves bytes
+            if len(compressed) < len(data):
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
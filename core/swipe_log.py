@@ -0,0 +1,129 @@
+"""
+Append-only log of swipe events (session, outfit, like/dislike, time) for
+offline ranking work.
+
+Off unless SWIPE_LOG_ENABLED. `record_swipe` only appends to an in-process
+buffer; a daemon thread writes the buffer to the swipe_event table of the
+sqlite file SWIPE_LOG_PATH in one executemany per batch (every SWIPE_LOG_FLUSH_INTERVAL seconds, or sooner once
+SWIPE_LOG_BATCH_SIZE events are waiting). The buffer holds at most
+SWIPE_LOG_BUFFER_SIZE events; past that the oldest are dropped and counted.
+A failed batch goes back into the buffer, and whatever is left is flushed at
+interpreter exit, so every event that fits is written at least once.
+"""
+from collections import deque
+from django.conf import settings
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_LOG = None
+_LOG_LOCK = threading.Lock()
+
+
+def _create_table(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS swipe_event ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " ts REAL NOT NULL,"
+        " session_id TEXT,"
+        " outfit_id TEXT,"
+        " action TEXT NOT NULL)"
+    )
+
+def write_swipe_events(events):
+    """Insert (ts, session_id, outfit_id, action) rows into SWIPE_LOG_PATH in one transaction."""
+    conn = sqlite3.connect(getattr(settings, "SWIPE_LOG_PATH", "/tmp/stylemaxx-swipes.sqlite3"), timeout=10)
+    try:
+        with conn:
+            cursor = conn.cursor()
+            _create_table(cursor)
+            cursor.executemany(
+                "INSERT INTO swipe_event (ts, session_id, outfit_id, action) VALUES (?, ?, ?, ?)",
+                events,
+            )
+    finally:
+        # the flusher thread shouldn't hold the sqlite file open between batches
+        conn.close()
+
+
+class SwipeEventLog:
+    def __init__(self, max_events=10000, batch_size=200, flush_interval=5.0, writer=write_swipe_events):
+        self.max_events = max_events
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.writer = writer
+        self.dropped = 0
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def append(self, event):
+        with self._lock:
+            self._events.append(event)
+            while len(self._events) > self.max_events:
+                self._events.popleft()
+                self.dropped += 1
+            pending = len(self._events)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="swipe-log-flusher", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of events written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))]
+                if not batch:
+                    return written
+                try:
+                    self.writer(batch)
+                except Exception:
+                    logger.exception("Swipe log flush failed; keeping %d events for the next try", len(batch))
+                    with self._lock:
+                        # back to the front, still within the memory bound
+                        room = max(self.max_events - len(self._events), 0)
+                        keep = batch[-room:] if room else []
+                        self.dropped += len(batch) - len(keep)
+                        self._events.extendleft(reversed(keep))
+                    return written
+                written += len(batch)
+
+
+def get_swipe_log():
+    global _LOG
+    with _LOG_LOCK:
+        if _LOG is None:
+            _LOG = SwipeEventLog(
+                max_events=getattr(settings, "SWIPE_LOG_BUFFER_SIZE", 10000),
+                batch_size=getattr(settings, "SWIPE_LOG_BATCH_SIZE", 200),
+                flush_interval=getattr(settings, "SWIPE_LOG_FLUSH_INTERVAL", 5.0),
+            )
+            atexit.register(_LOG.flush)
+        return _LOG
+
+def record_swipe(session_id, outfit_id, action):
+    """Queue one swipe; never touches the database on the request thread."""
+    if not getattr(settings, "SWIPE_LOG_ENABLED", False):
+        return
+    get_swipe_log().append((time.time(), session_id, outfit_id, action))
@@ -1,3 +1,944 @@
-from django.test import TestCase
+from collections import deque
+from io import StringIO
+from django.conf import settings
+from django.core import signing
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from pathlib import Path
+from PIL import Image
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from . import (
+    assets, catalog_db, categories, compositor, css_build, image_scheduler, profiling, selfie_dedup, singleflight,
+    swipe_log, views, warmup,
+)
+from .compact_catalog import CompactCatalog, _open_compact_catalog, build_compact_catalog_bytes, write_compact_catalog
+from .image_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, ImageAPIScheduler, TokenBucket, _Ticket
+from .management.commands import prerender_tryons
+from .storage import CompressedManifestStaticFilesStorage
+from .static_serving import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, serve_static
+from .vectors import VectorIndex, build_vector_index_bytes, normalize_tokens
+
+
+PRODUCTS = [
+    {"id": "p001", "name": "Heavy T-Shirt – black", "price": 14.99, "currency": "EUR", "url": "https://example.com/1",
+     "shop": "Zalando", "keywords": ["tshirt", "black", "short sleeve"], "category": "top"},
+    {"id": "p002", "name": "Baggy Jeans – blue", "price": 49.5, "currency": "EUR", "url": "https://example.com/2",
+     "shop": "Zalando", "keywords": ["jeans", "baggy", "blue"], "category": "bottom"},
+    {"id": "p003", "name": "Cargo Pants – olive", "price": None, "currency": "EUR", "url": "https://example.com/3",
+     "shop": "Snipes", "keywords": ["cargo", "olive", "baggy"], "category": "bottom"},
+    {"id": "p004", "name": "Zip Hoodie – grey", "price": 39.0, "currency": "EUR", "url": "https://example.com/4",
+     "shop": "Snipes", "keywords": ["hoodie", "grey", "zip"], "category": "top"},
+]
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_canonical_key_ignores_dict_order(self):
+        self.assertEqual(
+            singleflight.canonical_key("ns", {"a": 1, "b": 2}),
+            singleflight.canonical_key("ns", {"b": 2, "a": 1}),
+        )
+        self.assertNotEqual(singleflight.canonical_key("ns", 1), singleflight.canonical_key("other", 1))
+
+    def test_concurrent_calls_share_one_upstream_call(self):
+        calls = []
+        release = threading.Event()
+
+        @singleflight.single_flight(lambda x: f"test-{x}")
+        def slow(x):
+            calls.append(x)
+            release.wait(5)
+            return x * 2, None
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow(21))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(calls, [21])
+        self.assertEqual(results, [(42, None)] * 5)
+
+    def test_leader_error_reaches_waiters(self):
+        release = threading.Event()
+
+        @singleflight.single_flight(lambda: "test-error")
+        def failing():
+            release.wait(5)
+            raise RuntimeError("upstream down")
+
+        errors = []
+
+        def call():
+            try:
+                failing()
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, ["upstream down"] * 3)
+
+    def test_none_key_disables_coalescing(self):
+        calls = []
+
+        @singleflight.single_flight(lambda: None)
+        def fn():
+            calls.append(1)
+            return 1, None
+
+        fn()
+        fn()
+        self.assertEqual(len(calls), 2)
+
+    def test_lock_dir_shares_result_and_cleans_up(self):
+        calls = []
+
+        @singleflight.single_flight(lambda x: f"test-shared-{x}")
+        def fn(x):
+            calls.append(x)
+            return x, None
+
+        with tempfile.TemporaryDirectory() as lock_dir, override_settings(
+            SINGLE_FLIGHT_LOCK_DIR=lock_dir, SINGLE_FLIGHT_RESULT_TTL=60
+        ):
+            self.assertEqual(fn(1), (1, None))
+            # a later leader (e.g. another process) picks up the stored result
+            self.assertEqual(fn(1), (1, None))
+            self.assertEqual(calls, [1])
+            names = sorted(p.name for p in Path(lock_dir).iterdir())
+        self.assertEqual(names, ["test-shared-1.json"])
+
+    def test_expired_results_are_swept(self):
+        @singleflight.single_flight(lambda: "test-fresh")
+        def fn():
+            return 1, None
+
+        with tempfile.TemporaryDirectory() as lock_dir, override_settings(
+            SINGLE_FLIGHT_LOCK_DIR=lock_dir, SINGLE_FLIGHT_RESULT_TTL=60
+        ):
+            stale = Path(lock_dir) / "test-stale.json"
+            stale.write_text("[1, null]")
+            old = time.time() - 3600
+            os.utime(stale, (old, old))
+            self.addCleanup(setattr, singleflight, "_LAST_SWEEP", singleflight._LAST_SWEEP)
+            singleflight._LAST_SWEEP = 0.0
+            fn()
+            self.assertFalse(stale.exists())
+            self.assertTrue((Path(lock_dir) / "test-fresh.json").exists())
+
+
+class ImageSchedulerTests(SimpleTestCase):
+    def test_sheds_when_queue_is_too_long(self):
+        scheduler = ImageAPIScheduler(requests_per_minute=60)
+        scheduler.requests.tokens = 0
+        start = time.monotonic()
+        self.assertFalse(scheduler.acquire("s1", max_wait=0.5))
+        self.assertLess(time.monotonic() - start, 0.2)
+
+    def test_grants_immediately_with_budget(self):
+        scheduler = ImageAPIScheduler(requests_per_minute=60)
+        self.assertTrue(scheduler.acquire("s1"))
+        self.assertLess(scheduler.requests.tokens, 60)
+
+    def test_estimated_wait_is_not_capped_at_capacity(self):
+        scheduler = ImageAPIScheduler(requests_per_minute=20)
+        scheduler.requests.tokens = 0
+        scheduler._queues[PRIORITY_BACKGROUND]["s1"] = deque(_Ticket("s1", 0) for _ in range(100))
+        # 101 requests at 20/min
+        self.assertAlmostEqual(scheduler._estimated_wait(PRIORITY_BACKGROUND, 0), 303.0)
+        # interactive calls don't wait behind background ones
+        self.assertAlmostEqual(scheduler._estimated_wait(PRIORITY_INTERACTIVE, 0), 3.0)
+
+    def test_single_call_cost_is_capped_at_capacity(self):
+        bucket = TokenBucket(60, capacity=10)
+        bucket.tokens = 0
+        self.assertAlmostEqual(bucket.wait_for(100), 10.0)
+        self.assertAlmostEqual(bucket.backlog_wait(100), 100.0)
+        self.assertEqual(TokenBucket(0).wait_for(100), 0.0)
+
+    def test_offline_commands_get_their_own_budget(self):
+        self.addCleanup(setattr, image_scheduler, "_SCHEDULER", image_scheduler._SCHEDULER)
+        scheduler = image_scheduler.configure_image_scheduler(5)
+        self.assertIs(image_scheduler.get_image_scheduler(), scheduler)
+        self.assertAlmostEqual(scheduler.requests.rate, 5 / 60)
+        with self.assertRaises(CommandError):
+            call_command("prerender_tryons", "--dry-run", stdout=StringIO())
+
+    def test_round_robin_across_sessions_and_priorities(self):
+        scheduler = ImageAPIScheduler(requests_per_minute=0)
+        for session, priority in [("a", PRIORITY_BACKGROUND), ("a", PRIORITY_BACKGROUND), ("a", PRIORITY_BACKGROUND),
+                                  ("b", PRIORITY_BACKGROUND), ("c", PRIORITY_INTERACTIVE)]:
+            scheduler._queues[priority].setdefault(session, deque()).append(_Ticket(session, 0))
+
+        order = []
+        while (head := scheduler._head()) is not None:
+            priority, session, ticket = head
+            scheduler._grant(priority, ticket)
+            order.append(session)
+        self.assertEqual(order, ["c", "a", "b", "a", "a"])
+
+
+class StaticServingTests(SimpleTestCase):
+    BODY = b"body { color: black; }\n" * 10
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        root = Path(self.root.name)
+        (root / "css").mkdir()
+        (root / "css" / "app.0123456789ab.css").write_bytes(self.BODY)
+        (root / "css" / "app.0123456789ab.css.gz").write_bytes(b"gzip-bytes")
+        (root / "css" / "app.0123456789ab.css.br").write_bytes(b"br-bytes")
+        (root / "css" / "app.css").write_bytes(self.BODY)
+        settings_override = override_settings(STATIC_ROOT=self.root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.factory = RequestFactory()
+
+    def get(self, path, **headers):
+        return serve_static(self.factory.get("/static/" + path, **headers), path)
+
+    def test_picks_encoding(self):
+        response = self.get("css/app.0123456789ab.css", HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(b"".join(response.streaming_content), b"br-bytes")
+
+        response = self.get("css/app.0123456789ab.css", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+        response = self.get("css/app.0123456789ab.css")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content), self.BODY)
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+
+    def test_each_encoding_has_its_own_etag(self):
+        etags = {
+            self.get("css/app.0123456789ab.css", HTTP_ACCEPT_ENCODING=enc)["ETag"] for enc in ("br", "gzip", "")
+        }
+        self.assertEqual(len(etags), 3)
+
+        gzip_etag = self.get("css/app.0123456789ab.css", HTTP_ACCEPT_ENCODING="gzip")["ETag"]
+        response = self.get("css/app.0123456789ab.css", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=gzip_etag)
+        self.assertEqual(response.status_code, 304)
+        # a client that now gets brotli must not revalidate against the gzip body
+        response = self.get("css/app.0123456789ab.css", HTTP_ACCEPT_ENCODING="br", HTTP_IF_NONE_MATCH=gzip_etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_control(self):
+        self.assertEqual(self.get("css/app.0123456789ab.css")["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.get("css/app.css")["Cache-Control"], REVALIDATE_CACHE_CONTROL)
+
+    def test_byte_range(self):
+        response = self.get("css/app.0123456789ab.css", HTTP_RANGE="bytes=2-5", HTTP_ACCEPT_ENCODING="br")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.BODY[2:6])
+        self.assertEqual(response["Content-Range"], f"bytes 2-5/{len(self.BODY)}")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+        response = self.get("css/app.0123456789ab.css", HTTP_RANGE="bytes=-4")
+        self.assertEqual(response.content, self.BODY[-4:])
+
+        response = self.get("css/app.0123456789ab.css", HTTP_RANGE=f"bytes={len(self.BODY)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.BODY)}")
+
+    def test_missing_file_and_traversal(self):
+        from django.http import Http404
+
+        with self.assertRaises(Http404):
+            self.get("css/missing.css")
+        with self.assertRaises(Http404):
+            self.get("../etc/passwd")
+
+
+class StaticStorageTests(SimpleTestCase):
+    def test_without_manifest_names_are_hashed_from_the_sources(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = CompressedManifestStaticFilesStorage(location=tmp)
+            self.assertFalse(storage.hashed_files)
+            source = Path(settings.BASE_DIR) / "static" / "css" / "app.css"
+            digest = hashlib.md5(source.read_bytes()).hexdigest()[:12]
+            self.assertEqual(storage.stored_name("css/app.css"), f"css/app.{digest}.css")
+            with self.assertLogs("core.storage", "WARNING"):
+                self.assertEqual(storage.stored_name("css/missing.css"), "css/missing.css")
+
+    def test_stale_manifest_is_reported(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            Path(tmp, "staticfiles.json").write_text(
+                '{"version": "1.1", "paths": {"css/other.css": "css/other.0123456789ab.css"}}', encoding="utf-8"
+            )
+            storage = CompressedManifestStaticFilesStorage(location=tmp)
+            self.assertEqual(storage.stored_name("css/other.css"), "css/other.0123456789ab.css")
+            with self.assertLogs("core.storage", "WARNING"):
+                self.assertEqual(storage.stored_name("css/app.css"), "css/app.css")
+
+    def test_committed_stylesheet_is_current(self):
+        # the Python function hashes the committed file; the static build must upload the same bytes
+        css, _ = css_build.build_css(css_build.scan_classes())
+        self.assertEqual(css_build.css_output_path().read_text(encoding="utf-8"), css)
+
+
+class CompactCatalogTests(SimpleTestCase):
+    def test_round_trip(self):
+        catalog = CompactCatalog(build_compact_catalog_bytes(PRODUCTS, "v1"))
+        self.assertEqual(catalog.version, "v1")
+        self.assertEqual(len(catalog), len(PRODUCTS))
+        for row, p in enumerate(PRODUCTS):
+            product = catalog[row]
+            for key in ("id", "name", "price", "currency", "url", "shop", "keywords", "category"):
+                self.assertEqual(product[key], p[key], key)
+            self.assertEqual(product["static_path"], f"products/{p['id']}.png")
+
+    def test_lookups(self):
+        catalog = CompactCatalog(build_compact_catalog_bytes(PRODUCTS, "v1"))
+        self.assertEqual(catalog.row_for_id("p003"), 2)
+        self.assertIsNone(catalog.row_for_id("p999"))
+        found = catalog.get_by_ids(["p004", "p999", None, "p001"])
+        self.assertEqual(sorted(found), ["p001", "p004"])
+        self.assertEqual(found["p004"]["name"], "Zip Hoodie – grey")
+
+    def test_score_matches_json_ranking(self):
+        catalog = CompactCatalog(build_compact_catalog_bytes(PRODUCTS, "v1"))
+        ranked = catalog.score({"baggy": 2, "olive": 1})
+        # overlap desc, then name
+        self.assertEqual([p["id"] for p in ranked], ["p003", "p002", "p001", "p004"])
+        self.assertEqual([p["id"] for p in catalog.score({"baggy": 1}, category="bottom")], ["p002", "p003"])
+        self.assertEqual([p["id"] for p in catalog.score({"baggy": 1}, positive_only=True, limit=1, offset=1)], ["p003"])
+        self.assertEqual(catalog.score({}, category="shoes"), [])
+
+    def test_file_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "catalog.bin"
+            write_compact_catalog(PRODUCTS, "v2", path)
+            self.assertEqual([p.name for p in Path(tmp).iterdir()], ["catalog.bin"])
+            catalog = _open_compact_catalog(path)
+            self.assertEqual(catalog.version, "v2")
+            self.assertEqual([p["id"] for p in catalog], [p["id"] for p in PRODUCTS])
+
+
+class VectorIndexTests(SimpleTestCase):
+    OUTFITS = [{"id": "o1", "keywords": ["baggy", "jeans", "tshirt"]}]
+
+    def test_round_trip(self):
+        index = VectorIndex(build_vector_index_bytes(PRODUCTS, self.OUTFITS, "v1"))
+        self.assertEqual(index.version, "v1")
+        self.assertEqual([index.product_id(n) for n in range(len(index))], [p["id"] for p in PRODUCTS])
+        self.assertEqual([index.product_category(n) for n in range(len(index))], [p["category"] for p in PRODUCTS])
+        self.assertEqual(len(index.indptr), len(PRODUCTS) + 1)
+        self.assertEqual(sorted(index.token_index(tok) for tok in set(normalize_tokens(["jeans"]))), sorted(index.query_vector({"jeans": 1})))
+        self.assertIsNone(index.token_index("zzz"))
+
+    def test_nearest(self):
+        index = VectorIndex(build_vector_index_bytes(PRODUCTS, self.OUTFITS, "v1"))
+        ids = [product_id for product_id, _ in index.nearest({"jeans": 2}, k=2)]
+        self.assertEqual(ids[0], "p002")
+        # aliases/expansions: "tee" and "tshirt" land on the same dimension
+        self.assertEqual(index.nearest({"tee": 1}, k=1)[0][0], "p001")
+        bottoms = index.nearest({"baggy": 1}, k=None, category="bottom", positive_only=True)
+        self.assertEqual(sorted(product_id for product_id, _ in bottoms), ["p002", "p003"])
+        self.assertEqual(index.nearest({"hoodie": 1}, k=5, category="shoes"), [])
+
+    def test_nearest_matches_exact_ranking(self):
+        words = ["baggy", "jeans", "tee", "hoodie", "denim", "cargo", "linen", "wool", "boot", "sneaker"]
+        products = [
+            {"id": f"x{n:03d}", "title": "", "keywords": [words[n % 10], words[(n * 7) % 10]],
+             "category": ("top", "bottom", "shoes")[n % 3]}
+            for n in range(120)
+        ]
+        index = VectorIndex(build_vector_index_bytes(products, [], "v1"))
+
+        def exact(kw_counts, category=None, positive_only=False):
+            vec = index.query_vector(kw_counts)
+            rows = [
+                (-index._dot(vec, n), index.product_id(n)) for n in range(len(index))
+                if not category or index.product_category(n) == category
+            ]
+            return [product_id for neg, product_id in sorted(rows) if not (positive_only and neg >= 0)]
+
+        for kw_counts in ({"cargo": 3, "boot": 1}, {"linen": 1}, {"unknown": 1}):
+            for category in (None, "bottom"):
+                for positive_only in (False, True):
+                    expected = exact(kw_counts, category, positive_only)
+                    for offset, k in ((0, 5), (5, 20), (0, None)):
+                        got = index.nearest(kw_counts, k, category=category, offset=offset, positive_only=positive_only)
+                        top = expected[offset:offset + k if k is not None else None]
+                        if k is None or len(expected) < offset + k:
+                            # a short page always comes from the exact path
+                            self.assertEqual([product_id for product_id, _ in got], top)
+                        else:
+                            self.assertEqual(len(got), len(top))
+
+
+class CategoryTests(SimpleTestCase):
+    def test_classify_product(self):
+        cases = {
+            "Urban Classics Heavy T-Shirt – black": "top",
+            "Polo Ralph Lauren Prepster Chino Pant": "bottom",
+            "Carhartt WIP shirt jacket": "outerwear",
+            "Nike Air Force 1 sneakers": "shoes",
+            "New Era 9FORTY cap": "accessories",
+            "Gift card": None,
+        }
+        for name, expected in cases.items():
+            self.assertEqual(categories.classify_product({"name": name}), expected, name)
+        self.assertEqual(categories.classify_product({"name": "Nike", "keywords": ["trainingsbroek"]}), "bottom")
+
+    def test_outfit_slot(self):
+        self.assertEqual(categories.outfit_slot("outerwear"), "top")
+        self.assertEqual(categories.outfit_slot("bottom"), "bottom")
+        self.assertIsNone(categories.outfit_slot("shoes"))
+
+    def test_index_rows(self):
+        products = [{"name": "B hoodie"}, {"name": "A jeans"}, {"name": "C bomber jacket"}, {"name": "D mug"}]
+        index = categories.build_category_index(products, "v1")
+        index["_merged"] = {}
+        self.assertEqual(index["categories"], ["top", "bottom", "outerwear", None])
+        self.assertEqual(categories.category_rows(index), [1, 0, 2, 3])
+        self.assertEqual(categories.category_rows(index, "top"), [0])
+        self.assertEqual(categories.category_rows(index, ("outerwear", "top")), [0, 2])
+        self.assertTrue(categories.matches_category("top", ("top", "outerwear")))
+        self.assertFalse(categories.matches_category("shoes", "top"))
+
+    def test_stale_persisted_index_is_rebuilt(self):
+        self.addCleanup(setattr, categories, "_CATEGORY_INDEX", categories._CATEGORY_INDEX)
+        categories._CATEGORY_INDEX = None
+        products = [{"name": "Baggy jeans"}]
+        index = categories.load_category_index("test-version-that-is-not-persisted", products)
+        self.assertEqual(index["categories"], ["bottom"])
+        self.assertIs(categories.load_category_index("test-version-that-is-not-persisted", products), index)
+
+
+class TryonUpgradeTests(SimpleTestCase):
+    def post_upgrade(self, last_tryon, data):
+        session = self.client.session
+        session["last_tryon"] = last_tryon
+        session["model_image_url"] = views.DEFAULT_MODEL_URLS["male"]
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        return self.client.post(reverse("tryon_upgrade_dev"), data)
+
+    def test_next_tryon_quality(self):
+        with override_settings(TRYON_PROGRESSIVE=True):
+            self.assertEqual(views.next_tryon_quality("preview"), "low")
+        with override_settings(TRYON_PROGRESSIVE=False):
+            self.assertEqual(views.next_tryon_quality("preview"), "high")
+        self.assertEqual(views.next_tryon_quality("low"), "high")
+        for final in ("high", "fallback", None):
+            self.assertIsNone(views.next_tryon_quality(final))
+            self.assertIsNone(views.tryon_upgrade_delay_ms(final))
+
+    def test_upgrades_the_shown_outfit(self):
+        last_tryon = {"top_id": "p001", "bottom_id": "p010", "quality": "preview", "image_url": "/media/x.jpg"}
+        rendered = ("/media/tryon/x_low.png", None)
+        with mock.patch.object(views, "generate_tryon_image_with_openai", return_value=rendered) as generate, \
+                override_settings(TRYON_PROGRESSIVE=True):
+            response = self.post_upgrade(last_tryon, {"top_id": "p001", "bottom_id": "p010", "quality": "preview"})
+        self.assertEqual(generate.call_args.kwargs["quality"], "low")
+        self.assertEqual(generate.call_args.kwargs["priority"], views.PRIORITY_INTERACTIVE)
+        self.assertEqual(response.json()["image_url"], "/media/tryon/x_low.png")
+        self.assertEqual(response.json()["quality"], "low")
+        self.assertIsNotNone(response.json()["upgrade_after_ms"])
+
+    def test_moved_on_outfit_is_not_upgraded(self):
+        last_tryon = {"top_id": "p001", "bottom_id": "p010", "quality": "preview", "image_url": "/media/x.jpg"}
+        with mock.patch.object(views, "generate_tryon_image_with_openai") as generate:
+            response = self.post_upgrade(last_tryon, {"top_id": "p002", "bottom_id": "p010", "quality": "preview"})
+        generate.assert_not_called()
+        self.assertEqual(response.json(), {"image_url": None, "quality": None, "upgrade_after_ms": None})
+        # the session (a signed cookie) is left alone
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_final_quality_is_not_upgraded(self):
+        last_tryon = {"top_id": "p001", "bottom_id": "p010", "quality": "preview", "image_url": "/media/x.jpg"}
+        with mock.patch.object(views, "generate_tryon_image_with_openai") as generate:
+            response = self.post_upgrade(last_tryon, {"top_id": "p001", "bottom_id": "p010", "quality": "high"})
+        generate.assert_not_called()
+        self.assertEqual(response.json()["upgrade_after_ms"], None)
+        self.assertEqual(response.json()["quality"], "high")
+
+    def test_background_calls_from_requests_have_a_deadline(self):
+        scheduler = ImageAPIScheduler(requests_per_minute=20)
+        scheduler.requests.tokens = 0
+        scheduler._queues[PRIORITY_BACKGROUND]["other"] = deque(_Ticket("other", 0) for _ in range(20))
+        with mock.patch.object(views, "get_image_scheduler", return_value=scheduler), override_settings(
+            IMAGE_API_MAX_BACKGROUND_WAIT=30
+        ):
+            start = time.monotonic()
+            self.assertFalse(views.acquire_image_slot("s1", PRIORITY_BACKGROUND, "high", views.TRYON_SIZE))
+            self.assertLess(time.monotonic() - start, 0.5)
+
+
+class CssBuildTests(SimpleTestCase):
+    def test_compile_class(self):
+        self.assertEqual(css_build.compile_class("p-4")[3], ".p-4{padding:1rem}")
+        self.assertEqual(
+            css_build.compile_class("hover:bg-emerald-500")[3],
+            ".hover\\:bg-emerald-500:hover{background-color:#10b981}",
+        )
+        self.assertEqual(css_build.compile_class("md:grid-cols-2")[0], "md")
+        self.assertEqual(css_build.compile_class("max-h-[460px]")[3], ".max-h-\\[460px\\]{max-height:460px}")
+        self.assertEqual(
+            css_build.compile_class("file:mr-4")[3], ".file\\:mr-4::file-selector-button{margin-right:1rem}"
+        )
+        for unknown in ("text-slate-0", "nope:p-4", "not-a-utility"):
+            self.assertIsNone(css_build.compile_class(unknown), unknown)
+
+    def test_build_css_orders_variants_and_screens(self):
+        css, unknown = css_build.build_css({"md:p-2", "p-4", "hover:p-1", "x-y"})
+        self.assertTrue(css.startswith(css_build.PREFLIGHT))
+        self.assertEqual(
+            css[len(css_build.PREFLIGHT):],
+            ".p-4{padding:1rem}.hover\\:p-1:hover{padding:0.25rem}@media (min-width:768px){.md\\:p-2{padding:0.5rem}}",
+        )
+        self.assertEqual(unknown, ["x-y"])
+
+    def test_scan_classes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            Path(tmp, "page.html").write_text(
+                '<div class="p-4 {% if x %}md:p-2{% else %}p-1{% endif %}"><span class=\'text-white\'></span></div>',
+                encoding="utf-8",
+            )
+            self.assertEqual(css_build.scan_classes([Path(tmp)]), {"p-4", "md:p-2", "p-1", "text-white"})
+
+    def test_templates_only_use_known_classes(self):
+        # build_files.sh runs build_css --strict: this is what would fail the deploy
+        _, unknown = css_build.build_css(css_build.scan_classes())
+        self.assertEqual(unknown, [])
+
+
+class AssetManifestTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.base = Path(tmp.name)
+        (self.base / "static" / "products").mkdir(parents=True)
+        (self.base / "core" / "data").mkdir(parents=True)
+        self.write_image("products/nanop001.png", (255, 0, 0))
+        override = override_settings(BASE_DIR=self.base)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(setattr, assets, "_ASSET_MANIFEST", assets._ASSET_MANIFEST)
+        assets._ASSET_MANIFEST = None
+        call_command("build_asset_manifest", stdout=StringIO())
+
+    def write_image(self, rel, color, size=(4, 2)):
+        Image.new("RGB", size, color).save(self.base / "static" / rel)
+
+    def test_lookup(self):
+        entry = assets.get_garment_asset("p001")
+        self.assertEqual((entry["width"], entry["height"]), (4, 2))
+        self.assertEqual(assets.asset_fs_path(entry), self.base / "static" / "products" / "nanop001.png")
+        self.assertEqual(assets.file_content_hash(assets.asset_fs_path(entry)), entry["sha256"])
+        self.assertIsNone(assets.get_garment_asset("p999"))
+
+    def test_image_added_after_the_build_is_found(self):
+        assets.load_asset_manifest()
+        self.write_image("products/nanop002.png", (0, 255, 0))
+        self.assertEqual(assets.get_garment_asset("p002")["path"], "products/nanop002.png")
+
+    def test_manifest_is_trusted_and_check_catches_replaced_images(self):
+        before = assets.get_garment_asset("p001")["sha256"]
+        self.write_image("products/nanop001.png", (0, 0, 255))
+        # no per-request stat/hash: the build-time check is what catches this
+        self.assertEqual(assets.get_garment_asset("p001")["sha256"], before)
+        with self.assertRaises(CommandError):
+            call_command("build_asset_manifest", check=True, stdout=StringIO())
+        call_command("build_asset_manifest", stdout=StringIO())
+        call_command("build_asset_manifest", check=True, stdout=StringIO())
+
+    def test_check_catches_added_images(self):
+        self.write_image("products/nanop002.png", (0, 255, 0))
+        with self.assertRaises(CommandError):
+            call_command("build_asset_manifest", check=True, stdout=StringIO())
+
+    def test_committed_manifest_is_current(self):
+        # build_files.sh fails the deploy otherwise
+        with override_settings(BASE_DIR=Path(__file__).resolve().parent.parent):
+            call_command("build_asset_manifest", check=True, stdout=StringIO())
+
+
+class PrerenderTryonsTests(SimpleTestCase):
+    PRODUCTS = [
+        {"id": "t1", "name": "Tee", "category": "top"},
+        {"id": "t2", "name": "Hoodie", "category": "top"},
+        {"id": "t3", "name": "Shirt", "category": "top"},
+        {"id": "b1", "name": "Jeans", "category": "bottom"},
+        {"id": "s1", "name": "Sneakers", "category": "shoes"},
+    ]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.base = Path(tmp.name)
+        (self.base / "static").mkdir()
+        (self.base / "core" / "data").mkdir(parents=True)
+        self.render = self.base / "render.png"
+        Image.new("RGB", (2, 2)).save(self.render)
+
+        override = override_settings(BASE_DIR=self.base)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(setattr, image_scheduler, "_SCHEDULER", image_scheduler._SCHEDULER)
+        self.generate = mock.Mock(return_value=("/media/tryon/render.png", None))
+        for name, value in {
+            "load_products": lambda: self.PRODUCTS,
+            # t3 has no nano garment image
+            "get_garment_asset": lambda pid: None if pid == "t3" else {"path": f"products/nano{pid}.png"},
+            "resolve_image_path_from_url": lambda url: self.render,
+            "generate_tryon_image_with_openai": self.generate,
+        }.items():
+            patcher = mock.patch.object(prerender_tryons, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_command(self, *args):
+        call_command("prerender_tryons", "--rpm", "60", "--models", "male", "--no-collectstatic", *args,
+                     stdout=StringIO(), stderr=StringIO())
+        with views.prerendered_manifest_path().open(encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_renders_records_and_resumes(self):
+        manifest = self.run_command()
+        self.assertEqual(manifest, {"default_male_model": {
+            "t1+b1": "prerendered/default_male_model/t1_b1.png",
+            "t2+b1": "prerendered/default_male_model/t2_b1.png",
+        }})
+        self.assertEqual(self.generate.call_count, 2)
+        self.assertEqual(self.generate.call_args.kwargs["max_wait"], float("inf"))
+        # copied, not moved: sessions may still point at the cached render
+        self.assertTrue(self.render.exists())
+        self.assertTrue((self.base / "static" / manifest["default_male_model"]["t1+b1"]).exists())
+
+        self.generate.reset_mock()
+        self.run_command()
+        self.generate.assert_not_called()
+
+        (self.base / "static" / "prerendered" / "default_male_model" / "t2_b1.png").unlink()
+        self.run_command()
+        self.assertEqual(self.generate.call_count, 1)
+
+        self.generate.reset_mock()
+        self.run_command("--force")
+        self.assertEqual(self.generate.call_count, 2)
+
+    def test_failed_render_is_not_recorded(self):
+        self.generate.return_value = (None, "busy")
+        call_command("prerender_tryons", "--rpm", "60", "--models", "male", "--no-collectstatic",
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(views.prerendered_manifest_path().exists())
+
+    def test_lookup(self):
+        manifest = {"default_male_model": {"p001+p010": "prerendered/default_male_model/p001_p010.png"}}
+        with mock.patch.object(views, "load_prerendered_tryons", return_value=manifest), \
+                mock.patch.object(views, "static", side_effect=lambda rel: "/static/" + rel):
+            self.assertEqual(
+                views.lookup_prerendered_tryon(views.DEFAULT_MODEL_URLS["male"], "p001", "p010"),
+                "/static/prerendered/default_male_model/p001_p010.png",
+            )
+            self.assertIsNone(views.lookup_prerendered_tryon(views.DEFAULT_MODEL_URLS["male"], "p001", "p011"))
+            self.assertIsNone(views.lookup_prerendered_tryon("/media/models/mine.png", "p001", "p010"))
+
+
+class SelfieDedupTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media = Path(tmp.name)
+        (self.media / "models").mkdir()
+        for name in ("a.png", "b.png", "c.png"):
+            (self.media / "models" / name).write_bytes(b"png")
+        settings_override = override_settings(MEDIA_ROOT=self.media, MEDIA_URL="/media/", SELFIE_DHASH_MAX_DISTANCE=6)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_sha256_matches_across_sessions(self):
+        selfie_dedup.record_selfie_model("sha-a", "00000000000000ff", "female", "/media/models/a.png", "s1")
+        self.assertEqual(selfie_dedup.find_model_for_selfie("sha-a", None, "female", "s2"), "/media/models/a.png")
+        self.assertIsNone(selfie_dedup.find_model_for_selfie("sha-a", None, "male", "s1"))
+
+    def test_dhash_matches_only_within_session(self):
+        selfie_dedup.record_selfie_model("sha-a", "00000000000000ff", "female", "/media/models/a.png", "s1")
+        selfie_dedup.record_selfie_model("sha-b", "ffffffffffffff00", "female", "/media/models/b.png", "s1")
+        # 2 bits from a, far from b
+        self.assertEqual(selfie_dedup.find_model_for_selfie("sha-x", "00000000000000fc", "female", "s1"), "/media/models/a.png")
+        self.assertIsNone(selfie_dedup.find_model_for_selfie("sha-x", "00000000000000fc", "female", "s2"))
+        self.assertIsNone(selfie_dedup.find_model_for_selfie("sha-x", "0f0f0f0f0f0f0f0f", "female", "s1"))
+
+    def test_rerecord_replaces_and_index_is_bounded(self):
+        with override_settings(SELFIE_INDEX_MAX_ENTRIES=2):
+            selfie_dedup.record_selfie_model("sha-a", None, "female", "/media/models/a.png", "s1")
+            selfie_dedup.record_selfie_model("sha-b", None, "female", "/media/models/b.png", "s1")
+            selfie_dedup.record_selfie_model("sha-a", None, "female", "/media/models/c.png", "s1")
+            selfie_dedup.record_selfie_model("sha-c", None, "female", "/media/models/c.png", "s1")
+        # sha-b was the oldest recording left
+        self.assertIsNone(selfie_dedup.find_model_for_selfie("sha-b", None, "female"))
+        self.assertEqual(selfie_dedup.find_model_for_selfie("sha-a", None, "female"), "/media/models/c.png")
+
+    def test_missing_model_file_is_a_miss(self):
+        selfie_dedup.record_selfie_model("sha-a", None, "female", "/media/models/a.png", "s1")
+        (self.media / "models" / "a.png").unlink()
+        self.assertIsNone(selfie_dedup.find_model_for_selfie("sha-a", None, "female", "s1"))
+
+
+@override_settings(PROFILE_REQUESTS=True, PROFILE_SAMPLE_RATE=0.0, PROFILE_SECRET="profile-secret")
+class ProfilingTests(SimpleTestCase):
+    def request(self, token=None):
+        headers = {"HTTP_X_PROFILE": token} if token else {}
+        return RequestFactory().get(reverse("swipe"), **headers)
+
+    def test_token_validation(self):
+        token = profiling.make_profile_token()
+        self.assertTrue(profiling.has_valid_token(self.request(token)))
+        self.assertFalse(profiling.has_valid_token(self.request()))
+        self.assertFalse(profiling.has_valid_token(self.request(token + "x")))
+        # signed with SECRET_KEY instead of PROFILE_SECRET
+        forged = signing.TimestampSigner(salt=profiling.PROFILE_TOKEN_SALT).sign("profile")
+        self.assertFalse(profiling.has_valid_token(self.request(forged)))
+        with override_settings(PROFILE_TOKEN_MAX_AGE=-1):
+            self.assertFalse(profiling.has_valid_token(self.request(token)))
+        with override_settings(PROFILE_SECRET=""):
+            self.assertFalse(profiling.has_valid_token(self.request(token)))
+            with self.assertRaises(CommandError):
+                call_command("profile_token", stdout=StringIO(), stderr=StringIO())
+
+    def test_middleware_falls_back_to_unprofiled(self):
+        response = HttpResponse("ok")
+        middleware = profiling.RequestProfilerMiddleware(lambda request: response)
+        request = self.request(profiling.make_profile_token())
+        with mock.patch.object(profiling.RequestProfilerMiddleware, "write_profile") as write_profile:
+            # another request holds the profiler
+            with profiling._PROFILE_LOCK:
+                self.assertNotIn("X-Profile-Id", middleware(request))
+            # another profiler is already active in this process
+            with mock.patch.object(profiling.cProfile.Profile, "enable", side_effect=ValueError("busy")), \
+                    self.assertLogs("core.profiling", "ERROR"):
+                self.assertNotIn("X-Profile-Id", middleware(request))
+            write_profile.assert_not_called()
+            with override_settings(PROFILE_ENGINE="cprofile"):
+                self.assertIn("X-Profile-Id", middleware(request))
+            write_profile.assert_called_once()
+        self.assertFalse(profiling._PROFILE_LOCK.locked())
+
+
+class WarmupTests(SimpleTestCase):
+    def fake_steps(self):
+        def broken():
+            raise RuntimeError("secret detail")
+        return [("first", lambda: None), ("broken", broken), ("last", lambda: None)]
+
+    def test_run_warmup_reports_errors_and_keeps_going(self):
+        with mock.patch.object(warmup, "warmup_steps", self.fake_steps), self.assertLogs("core.warmup", "WARNING"):
+            report = warmup.run_warmup()
+        self.assertEqual([step["step"] for step in report], ["first", "broken", "last"])
+        self.assertEqual([step["error"] for step in report], [None, "secret detail", None])
+
+    def test_compositor_step_follows_placeholder_setting(self):
+        with override_settings(TRYON_PLACEHOLDER=True):
+            self.assertIn("compositor_models", dict(warmup.warmup_steps()))
+        with override_settings(TRYON_PLACEHOLDER=False):
+            self.assertNotIn("compositor_models", dict(warmup.warmup_steps()))
+
+    def get(self, **extra):
+        with mock.patch.object(warmup, "warmup_steps", self.fake_steps), self.assertLogs("core.warmup", "WARNING"):
+            return views.warmup_view(RequestFactory().get(reverse("warmup"), **extra))
+
+    @override_settings(WARMUP_TOKEN="")
+    def test_public_warmup_hides_errors(self):
+        body = json.loads(self.get().content)
+        self.assertEqual(set(body), {"total_ms", "steps"})
+        self.assertEqual([set(step) for step in body["steps"]], [{"step", "ms"}] * 3)
+        self.assertNotIn(b"secret detail", self.get().content)
+
+    @override_settings(WARMUP_TOKEN="warm")
+    def test_token_check(self):
+        with mock.patch.object(warmup, "run_warmup") as run_warmup:
+            for extra in ({}, {"HTTP_AUTHORIZATION": "Bearer nope"}, {"QUERY_STRING": "token=nope"}):
+                self.assertEqual(views.warmup_view(RequestFactory().get(reverse("warmup"), **extra)).status_code, 403)
+            run_warmup.assert_not_called()
+        body = json.loads(self.get(HTTP_AUTHORIZATION="Bearer warm").content)
+        self.assertFalse(body["ok"])
+        self.assertEqual(body["steps"][1]["error"], "secret detail")
+        self.assertEqual(self.get(QUERY_STRING="token=warm").status_code, 200)
+
+
+class CompositorCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.base = Path(tmp.name)
+        (self.base / "media" / "models").mkdir(parents=True)
+        override = override_settings(BASE_DIR=self.base, MEDIA_ROOT=self.base / "media", MEDIA_URL="/media/")
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(setattr, assets, "_FILE_HASHES", assets._FILE_HASHES)
+        assets._FILE_HASHES = assets.OrderedDict()
+        self.model = self.base / "media" / "models" / "m.png"
+        self.top = self.base / "top.png"
+        self.bottom = self.base / "bottom.png"
+        Image.new("RGB", (40, 80), (200, 200, 200)).save(self.model)
+        Image.new("RGB", (20, 20), (255, 0, 0)).save(self.top)
+        Image.new("RGB", (20, 20), (0, 0, 255)).save(self.bottom)
+
+    def test_file_content_hash_is_memoized_per_size_and_mtime(self):
+        expected = hashlib.sha256(self.model.read_bytes()).hexdigest()
+        with mock.patch.object(Path, "read_bytes", autospec=True, side_effect=Path.read_bytes) as read_bytes:
+            self.assertEqual(assets.file_content_hash(self.model), expected)
+            self.assertEqual(assets.file_content_hash(self.model), expected)
+            self.assertEqual(read_bytes.call_count, 1)
+        Image.new("RGB", (40, 81), (0, 0, 0)).save(self.model)
+        self.assertEqual(assets.file_content_hash(self.model), hashlib.sha256(self.model.read_bytes()).hexdigest())
+        self.assertIsNone(assets.file_content_hash(self.base / "missing.png"))
+
+    def test_compose_tryon_preview_reuses_the_file(self):
+        garments = [("top", self.top), ("bottom", self.bottom)]
+        url, err = compositor.compose_tryon_preview(self.model, garments)
+        self.assertIsNone(err)
+        self.assertTrue((self.base / "media" / url.removeprefix("/media/")).is_file())
+        with mock.patch.object(compositor, "composite_tryon") as composite:
+            self.assertEqual(compositor.compose_tryon_preview(self.model, garments), (url, None))
+            composite.assert_not_called()
+        other_url, _ = compositor.compose_tryon_preview(self.model, [("top", self.top)])
+        self.assertNotEqual(other_url, url)
+        # a regenerated model with the same name gets a new composite
+        mtime = self.model.stat().st_mtime_ns
+        Image.new("RGB", (40, 80), (10, 10, 10)).save(self.model)
+        os.utime(self.model, ns=(mtime + 10**9, mtime + 10**9))
+        self.assertNotEqual(compositor.compose_tryon_preview(self.model, garments)[0], url)
+
+
+class StylistPromptTests(SimpleTestCase):
+    def test_compact_catalog_encoding(self):
+        extra = {"id": "p000", "name": "Cap", "price": None, "keywords": None, "category": None}
+        lines = views.compact_catalog(list(reversed(PRODUCTS)) + [extra]).split("\n")
+        self.assertEqual(lines, [
+            "p000||Cap||",
+            "p001|top|Heavy T-Shirt – black|14.99EUR|tshirt,black,short sleeve",
+            "p002|bottom|Baggy Jeans – blue|49.5EUR|jeans,baggy,blue",
+            "p003|bottom|Cargo Pants – olive||cargo,olive,baggy",
+            "p004|top|Zip Hoodie – grey|39EUR|hoodie,grey,zip",
+        ])
+        many = dict(PRODUCTS[0], keywords=["a", "b", "c", "d"])
+        self.assertTrue(views.compact_catalog([many]).endswith("|a,b,c"))
+
+    def test_shared_prefix_comes_before_per_user_content(self):
+        first = views.build_stylist_messages(PRODUCTS, ["baggy"], last_top_id="p001")
+        second = views.build_stylist_messages(list(reversed(PRODUCTS)), ["hoodie", "zip"], last_bottom_id="p002")
+        self.assertEqual([m["role"] for m in first], ["system", "user"])
+        self.assertEqual(first[0], second[0])
+        catalog_part = "Catalog:\n" + views.compact_catalog(PRODUCTS) + "\n"
+        for messages in (first, second):
+            self.assertTrue(messages[1]["content"].startswith(catalog_part))
+        self.assertEqual(
+            first[1]["content"][len(catalog_part):],
+            "\nUser style keywords (most important first): baggy.\nDo not reuse top p001 if possible.",
+        )
+        self.assertIn("none.", views.build_stylist_messages(PRODUCTS, [])[1]["content"])
+
+
+class CatalogDbTests(TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, catalog_db, "_INDEX_READY_VERSION", catalog_db._INDEX_READY_VERSION)
+        catalog_db.rebuild_catalog_index(PRODUCTS, "v1")
+
+    def json_scan(self, kw_counts, category=None, limit=None, offset=0, positive_only=False):
+        """The in-memory backend's ranking: score desc, then name."""
+        rows = sorted((p for p in PRODUCTS if categories.matches_category(p["category"], category)), key=lambda p: p["name"])
+        scored = [(sum(kw_counts.get(kw, 0) for kw in p["keywords"]), p) for p in rows]
+        scored = [(s, p) for s, p in scored if s > 0 or not positive_only]
+        scored.sort(key=lambda sp: -sp[0])
+        end = None if limit is None else offset + limit
+        return [p["id"] for _, p in scored[offset:end]]
+
+    def test_ranking_and_pages_match_the_json_scan(self):
+        queries = [{}, {"baggy": 2, "olive": 1}, {"short sleeve": 1, "zip": 2}, {"unknown": 3}]
+        for kw_counts in queries:
+            for category in (None, "bottom", ("top", "bottom"), "shoes"):
+                for positive_only in (False, True):
+                    for limit, offset in ((None, 0), (1, 0), (2, 1), (5, 3)):
+                        args = (kw_counts, category, limit, offset, positive_only)
+                        got = catalog_db.query_scored_products(
+                            kw_counts, category=category, limit=limit, offset=offset, positive_only=positive_only
+                        )
+                        self.assertEqual([p["id"] for p in got], self.json_scan(*args), args)
+
+    def test_rows_round_trip_and_rebuild_on_new_version(self):
+        self.assertEqual(catalog_db.get_products_by_ids(["p004", "p999", None]), {"p004": PRODUCTS[3]})
+        reader = mock.Mock(return_value=PRODUCTS[:2])
+        catalog_db.ensure_catalog_index("v1", reader)
+        reader.assert_not_called()
+        catalog_db.ensure_catalog_index("v2", reader)
+        reader.assert_called_once()
+        self.assertEqual(catalog_db.indexed_catalog_version(), "v2")
+        self.assertEqual(sorted(catalog_db.get_products_by_ids(["p001", "p003"])), ["p001"])
+
+
+@mock.patch.object(swipe_log.SwipeEventLog, "_ensure_thread")
+class SwipeEventLogTests(SimpleTestCase):
+    def test_buffer_drops_oldest_past_the_bound(self, ensure_thread):
+        written = []
+        log = swipe_log.SwipeEventLog(max_events=3, batch_size=2, writer=written.append)
+        for n in range(5):
+            log.append(n)
+        self.assertEqual(log.dropped, 2)
+        self.assertEqual(log.flush(), 3)
+        self.assertEqual(written, [[2, 3], [4]])
+        self.assertEqual(log.flush(), 0)
+
+    def test_failed_batch_is_requeued_in_order(self, ensure_thread):
+        written = []
+        log = swipe_log.SwipeEventLog(max_events=10, batch_size=2, writer=mock.Mock(side_effect=OSError("locked")))
+        for n in range(3):
+            log.append(n)
+        with self.assertLogs("core.swipe_log", "ERROR"):
+            self.assertEqual(log.flush(), 0)
+        self.assertEqual(log.dropped, 0)
+        log.writer = written.append
+        self.assertEqual(log.flush(), 3)
+        self.assertEqual(written, [[0, 1], [2]])
+
+    def test_requeue_stays_within_the_bound(self, ensure_thread):
+        log = swipe_log.SwipeEventLog(max_events=3, batch_size=2)
+
+        def fail_after_more_events(batch):
+            # swipes keep arriving while the write is failing
+            log.append(10)
+            raise OSError("disk full")
+
+        log.writer = fail_after_more_events
+        for n in range(3):
+            log.append(n)
+        with self.assertLogs("core.swipe_log", "ERROR"):
+            log.flush()
+        # room for one of the failed batch [0, 1]: the newer one goes back in front
+        self.assertEqual(list(log._events), [1, 2, 10])
+        self.assertEqual(log.dropped, 1)
+
+    def test_write_swipe_events(self, ensure_thread):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "swipes.sqlite3"
+            with override_settings(SWIPE_LOG_PATH=str(path)):
+                swipe_log.write_swipe_events([(1.0, "s1", "o1", "like")])
+                swipe_log.write_swipe_events([(2.0, "s1", "o2", "dislike")])
+            conn = sqlite3.connect(path)
+            try:
+                rows = conn.execute("SELECT ts, session_id, outfit_id, action FROM swipe_event ORDER BY id").fetchall()
+            finally:
+                conn.close()
+        self.assertEqual(rows, [(1.0, "s1", "o1", "like"), (2.0, "s1", "o2", "dislike")])
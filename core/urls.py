@@ -7,9 +7,11 @@ urlpatterns = [
     path('swipe/', views.swipe_view, name='swipe'),
     path('outfits/', views.outfits_view, name='outfits'),
     path("onboarding/", views.onboarding_view, name="onboarding"),
+    path("warmup/", views.warmup_view, name="warmup"),
 
     # sandbox routes for mehmet :)
     path('dev/mystore/', views.mystore_view_dev, name='mystore_dev'),
     path('dev/swipe/', views.swipe_view_dev, name='swipe_dev'),
     path('dev/outfits/', views.outfits_view_dev, name='outfits_dev'),
+    path('dev/outfits/tryon-upgrade/', views.tryon_upgrade_view_dev, name='tryon_upgrade_dev'),
 ]
\ No newline at end of file
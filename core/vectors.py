@@ -0,0 +1,387 @@
+"""
+TF-IDF keyword vectors + approximate nearest-neighbour index for recommendations.
+
+Outfit keywords ("t", "shirt", "leg") and product keywords ("tshirt",
+"short sleeve") are normalized into one token space, weighted by TF-IDF over
+both catalogs and L2-normalized. Products are hashed into random-hyperplane
+LSH tables; a user's liked keywords become a query vector that only has to
+be compared with the products in its (multi-probed) buckets. When the
+buckets within two bits of the query's signature don't hold a full page, the
+exact answer comes from the token postings instead: only products sharing a
+token with the query can score above 0, and the rest follow in id order.
+
+Everything, ids, categories and vocabulary included, lives in packed arrays
+after a small JSON header, so the mmap'd file is the only per-worker copy.
+The index is built offline with `manage.py build_vector_index` into
+core/data/vector_index.bin and memory-mapped by every worker. If it is missing
+or stale, it is built in memory once per process from the loaded catalogs.
+"""
+from django.conf import settings
+from array import array
+from pathlib import Path
+import bisect
+import itertools
+import json
+import math
+import mmap
+import os
+import random
+import re
+import struct
+
+from .categories import matches_category
+
+_MAGIC = b"SMXVEC02"
+_VECTOR_INDEX = None
+
+LSH_TABLES = 8
+LSH_MAX_BITS = 16
+# signatures up to this many bits away are probed before the exact fallback
+LSH_MAX_PROBE_RADIUS = 2
+
+# words that carry no style signal once keywords are split apart
+_STOP_TOKENS = {"a", "and", "the", "of", "with", "t", "up", "over", "extra", "look", "style", "detail"}
+
+# spelling variants that should land on the same dimension
+_TOKEN_ALIASES = {
+    "tee": "tshirt",
+    "trouser": "pant",
+    "trainingsbroek": "sweatpant",
+    "sweater": "sweatshirt",
+    "crewneck": "crew",
+    "windjack": "jacket",
+    "sneaker": "shoe",
+}
+
+# compound words that also imply their parts
+_TOKEN_EXPANSIONS = {
+    "tshirt": ("shirt", "short", "sleeve"),
+    "longsleeve": ("long", "sleeve", "shirt"),
+    "sweatpant": ("pant",),
+    "chino": ("pant",),
+    "jean": ("denim", "pant"),
+    "hoodie": ("sweatshirt",),
+}
+
+
+# ========= Tokens =========
+def _singular(word):
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+def normalize_tokens(keywords):
+    """Split keyword phrases into canonical tokens ("Short Sleeve" -> ["short", "sleeve"])."""
+    tokens = []
+    for kw in keywords or []:
+        for word in re.split(r"\W+", (kw or "").lower()):
+            if not word or word in _STOP_TOKENS:
+                continue
+            word = _singular(word)
+            word = _TOKEN_ALIASES.get(word, word)
+            tokens.append(word)
+            tokens.extend(_TOKEN_EXPANSIONS.get(word, ()))
+    return tokens
+
+def product_tokens(p):
+    return normalize_tokens(list(p.get("keywords", []) or []) + [p.get("name", "")])
+
+def outfit_tokens(o):
+    return normalize_tokens(o.get("keywords", []))
+
+
+# ========= Vectors =========
+def _l2_normalize(vec):
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    if not norm:
+        return {}
+    return {i: v / norm for i, v in vec.items()}
+
+def _tfidf(tokens, vocab, idf):
+    counts = {}
+    for tok in tokens:
+        i = vocab.get(tok)
+        if i is not None:
+            counts[i] = counts.get(i, 0) + 1
+    return _l2_normalize({i: (1 + math.log(c)) * idf[i] for i, c in counts.items()})
+
+def _signature(vec, planes, table, bits, dim):
+    sig = 0
+    base = table * bits * dim
+    for b in range(bits):
+        off = base + b * dim
+        if sum(v * planes[off + i] for i, v in vec.items()) >= 0:
+            sig |= 1 << b
+    return sig
+
+def _pack_strings(strings):
+    offsets, blob = array("I", [0]), bytearray()
+    for value in strings:
+        blob += value.encode("utf-8")
+        offsets.append(len(blob))
+    return offsets, array("B", blob)
+
+
+# ========= Index build / (mmap) load =========
+def vector_index_path() -> Path:
+    return Path(settings.BASE_DIR) / "core" / "data" / "vector_index.bin"
+
+def lsh_bits_for(n):
+    # ~4 products per bucket before multi-probing
+    return max(4, min(LSH_MAX_BITS, math.ceil(math.log2(max(n, 1))) - 2))
+
+def build_vector_index_bytes(products, outfits, version, tables=LSH_TABLES, bits=None, seed=0):
+    """
+    Fit the vocabulary/IDF on products + outfits and serialize the product
+    vectors, LSH tables, postings and string tables. Layout: magic, header
+    length, JSON header, then typed arrays at the offsets recorded in the header.
+    """
+    docs = [product_tokens(p) for p in products] + [outfit_tokens(o) for o in outfits]
+    df = {}
+    for tokens in docs:
+        for tok in set(tokens):
+            df[tok] = df.get(tok, 0) + 1
+    vocab_list = sorted(df)
+    vocab = {tok: i for i, tok in enumerate(vocab_list)}
+    n_docs = len(docs)
+    idf = [math.log((1 + n_docs) / (1 + df[tok])) + 1 for tok in vocab_list]
+    dim = len(vocab_list)
+    bits = bits or lsh_bits_for(len(products))
+
+    rng = random.Random(seed)
+    planes = array("f", (rng.gauss(0, 1) for _ in range(tables * bits * dim)))
+
+    indptr, indices, values = array("I", [0]), array("I"), array("f")
+    vectors = []
+    for p in products:
+        vec = _tfidf(product_tokens(p), vocab, idf)
+        vectors.append(vec)
+        for i in sorted(vec):
+            indices.append(i)
+            values.append(vec[i])
+        indptr.append(len(indices))
+
+    bucket_sigs, bucket_ids = array("I"), array("I")
+    for t in range(tables):
+        pairs = sorted((_signature(vec, planes, t, bits, dim), n) for n, vec in enumerate(vectors))
+        bucket_sigs.extend(sig for sig, _ in pairs)
+        bucket_ids.extend(n for _, n in pairs)
+
+    # token -> products containing it (the transpose of indptr/indices)
+    postings = [[] for _ in range(dim)]
+    for n, vec in enumerate(vectors):
+        for i in vec:
+            postings[i].append(n)
+    post_indptr, post_ids = array("I", [0]), array("I")
+    for rows in postings:
+        post_ids.extend(rows)
+        post_indptr.append(len(post_ids))
+
+    # strings as offsets into one utf-8 blob; utf-8 byte order = code point order, so vocab stays bisectable
+    vocab_offsets, vocab_blob = _pack_strings(vocab_list)
+    ids = [str(p["id"]) for p in products]
+    id_offsets, id_blob = _pack_strings(ids)
+    id_order = array("I", sorted(range(len(ids)), key=lambda n: ids[n].encode("utf-8")))
+    id_rank = array("I", [0] * len(ids))
+    for rank, n in enumerate(id_order):
+        id_rank[n] = rank
+    category_names = sorted({p.get("category") or "" for p in products})
+    category = array("H", (category_names.index(p.get("category") or "") for p in products))
+
+    sections = [
+        ("planes", planes), ("indptr", indptr), ("indices", indices), ("values", values),
+        ("bucket_sigs", bucket_sigs), ("bucket_ids", bucket_ids), ("idf", array("f", idf)),
+        ("post_indptr", post_indptr), ("post_ids", post_ids),
+        ("vocab_offsets", vocab_offsets), ("id_offsets", id_offsets), ("id_order", id_order), ("id_rank", id_rank),
+        # narrower arrays last, so the 4-byte ones stay aligned
+        ("category", category), ("vocab_blob", vocab_blob), ("id_blob", id_blob),
+    ]
+    header = {
+        "version": version,
+        "count": len(products),
+        "dim": dim,
+        "tables": tables,
+        "bits": bits,
+        "category_names": category_names,
+        "sections": {},
+    }
+    # offsets are relative to the end of the header block
+    offset = 0
+    for name, arr in sections:
+        header["sections"][name] = [arr.typecode, offset, len(arr)]
+        offset += len(arr) * arr.itemsize
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-(len(_MAGIC) + 4 + len(header_bytes)) % 4)  # keep arrays 4-byte aligned
+    body = b"".join(arr.tobytes() for _, arr in sections)
+    return _MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes + body
+
+def write_vector_index(products, outfits, version):
+    data = build_vector_index_bytes(products, outfits, version)
+    out = vector_index_path()
+    tmp = out.with_suffix(f".bin.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    tmp.replace(out)
+    return out, len(data)
+
+
+class VectorIndex:
+    """Read-only view over a serialized index (an mmap or an in-memory bytes)."""
+
+    def __init__(self, buf):
+        self._buf = buf
+        if bytes(buf[:len(_MAGIC)]) != _MAGIC:
+            raise ValueError("Not a vector index file")
+        (header_len,) = struct.unpack_from("<I", buf, len(_MAGIC))
+        start = len(_MAGIC) + 4
+        header = json.loads(bytes(buf[start:start + header_len]))
+        body = memoryview(buf)[start + header_len:]
+
+        self.version = header["version"]
+        self.count = header["count"]
+        self.dim = header["dim"]
+        self.tables = header["tables"]
+        self.bits = header["bits"]
+        self.category_names = header["category_names"]
+        for name, (typecode, offset, length) in header["sections"].items():
+            size = array(typecode).itemsize
+            setattr(self, name, body[offset:offset + length * size].cast(typecode))
+
+    def __len__(self):
+        return self.count
+
+    def product_id(self, n):
+        return bytes(self.id_blob[self.id_offsets[n]:self.id_offsets[n + 1]]).decode("utf-8")
+
+    def product_category(self, n):
+        return self.category_names[self.category[n]] or None
+
+    def token_index(self, token):
+        """Dimension of a normalized token, or None if no document has it."""
+        target = token.encode("utf-8")
+        lo, hi = 0, self.dim
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self.vocab_blob[self.vocab_offsets[mid]:self.vocab_offsets[mid + 1]]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.dim and bytes(self.vocab_blob[self.vocab_offsets[lo]:self.vocab_offsets[lo + 1]]) == target:
+            return lo
+        return None
+
+    def query_vector(self, kw_counts):
+        """User preference vector: liked keyword counts projected into the shared space."""
+        counts = {}
+        for kw, c in (kw_counts or {}).items():
+            for tok in normalize_tokens([kw]):
+                i = self.token_index(tok)
+                if i is not None and c:
+                    counts[i] = counts.get(i, 0) + c
+        return _l2_normalize({i: (1 + math.log(c)) * self.idf[i] for i, c in counts.items() if c > 0})
+
+    def _dot(self, vec, n):
+        total = 0.0
+        for j in range(self.indptr[n], self.indptr[n + 1]):
+            v = vec.get(self.indices[j])
+            if v is not None:
+                total += v * self.values[j]
+        return total
+
+    def _candidates(self, vec, radius):
+        """Products sharing an LSH bucket with `vec`, probing signatures up to `radius` bits away."""
+        n = self.count
+        found = set()
+        for t in range(self.tables):
+            sig = _signature(vec, self.planes, t, self.bits, self.dim)
+            lo_base = t * n
+            sigs = self.bucket_sigs[lo_base:lo_base + n]
+            for r in range(radius + 1):
+                for flipped in itertools.combinations(range(self.bits), r):
+                    probe = sig
+                    for b in flipped:
+                        probe ^= 1 << b
+                    lo = bisect.bisect_left(sigs, probe)
+                    while lo < n and sigs[lo] == probe:
+                        found.add(self.bucket_ids[lo_base + lo])
+                        lo += 1
+        return found
+
+    def _matching_rows(self, vec):
+        """Every product sharing a token with `vec`, i.e. every product that can score above 0."""
+        found = set()
+        for i in vec:
+            found.update(self.post_ids[self.post_indptr[i]:self.post_indptr[i + 1]])
+        return found
+
+    def nearest(self, kw_counts, k, category=None, offset=0, positive_only=False):
+        """
+        Approximate top-k product ids by cosine similarity, best first
+        (ties broken by id). Probes buckets up to LSH_MAX_PROBE_RADIUS bits
+        away; if they don't hold enough candidates for the requested page,
+        the answer is computed exactly from the token postings.
+        """
+        vec = self.query_vector(kw_counts)
+        wanted = offset + k if k is not None else None
+        codes = None
+        if category:
+            codes = {c for c, name in enumerate(self.category_names) if matches_category(name or None, category)}
+
+        def rank(pool):
+            scored = []
+            for n in pool:
+                if codes is not None and self.category[n] not in codes:
+                    continue
+                score = self._dot(vec, n)
+                if positive_only and score <= 0:
+                    continue
+                scored.append((-score, self.id_rank[n], n))
+            scored.sort()
+            return scored
+
+        scored = []
+        if vec and wanted is not None:
+            for radius in range(1, LSH_MAX_PROBE_RADIUS + 1):
+                scored = rank(self._candidates(vec, radius))
+                if len(scored) >= wanted:
+                    break
+
+        if wanted is None or len(scored) < wanted:
+            scored = rank(self._matching_rows(vec)) if vec else []
+            if not positive_only:
+                # everything else scores 0 and follows in id order
+                seen = {n for _, _, n in scored}
+                for n in self.id_order:
+                    if wanted is not None and len(scored) >= wanted:
+                        break
+                    if n not in seen and (codes is None or self.category[n] in codes):
+                        scored.append((0.0, self.id_rank[n], n))
+
+        return [(self.product_id(n), -neg) for neg, _, n in scored[offset:wanted]]
+
+
+def load_vector_index(version, products_loader, outfits_loader):
+    """
+    mmap the prebuilt index when it matches the catalog version, otherwise
+    build it in memory from the loaded catalogs (once per process).
+    """
+    global _VECTOR_INDEX
+    if _VECTOR_INDEX is not None and _VECTOR_INDEX.version == version:
+        return _VECTOR_INDEX
+
+    index = None
+    try:
+        with vector_index_path().open("rb") as f:
+            index = VectorIndex(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        if index.version != version:
+            index = None
+    except (OSError, ValueError):
+        index = None
+
+    if index is None:
+        index = VectorIndex(build_vector_index_bytes(products_loader(), outfits_loader(), version))
+
+    _VECTOR_INDEX = index
+    return _VECTOR_INDEX
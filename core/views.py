@@ -1,25 +1,58 @@
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.conf import settings
 from pathlib import Path
 from django.core.files.storage import default_storage
-from django.utils.crypto import get_random_string
+from django.templatetags.static import static
+from django.utils.crypto import constant_time_compare, get_random_string
 from openai import OpenAI
+from .assets import asset_fs_path, file_content_hash, get_asset, get_garment_asset, load_asset_manifest
+from .image_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, estimate_image_tokens, get_image_scheduler
+from . import catalog_db
+from .categories import CLASSIFIER_VERSION, OUTFIT_SLOTS, category_rows, load_category_index, outfit_slot
+from .compact_catalog import load_compact_catalog
+from .compositor import compose_tryon_preview
+from .profiling import timed_phase
+from .selfie_dedup import find_model_for_selfie, hash_upload, record_selfie_model
+from .singleflight import canonical_key, single_flight
+from .swipe_log import record_swipe
+from .vectors import load_vector_index
 import base64
+import hashlib
 import json
+import logging
 import requests
 import random
 import os
 
+logger = logging.getLogger(__name__)
+
 _OUTFITS_CACHE = None
 _PRODUCTS_CACHE = None
+_PRODUCTS_BY_ID = None
+_CATALOG_VERSION = None
+_PRERENDERED_CACHE = None
+_OPENAI_CLIENT = None
+
+# Base models shared by everyone who skips the selfie upload
+DEFAULT_MODEL_URLS = {
+    "male": "/static/models/default_male_model.png",
+    "female": "/static/models/default_female_model.png",
+}
 
 # ======= Nano Banana image gen ========
 def get_openai_client():
+    """
+    One client per process (and API key): its HTTP connection pool is reused
+    across requests instead of a new client + TLS handshake per image call.
+    """
+    global _OPENAI_CLIENT
     api_key = getattr(settings, "OPENAI_API_KEY", "") or os.environ.get("OPENAI_API_KEY")
     if not api_key:
         return None, "Missing OPENAI_API_KEY"
-    client = OpenAI(api_key=api_key)
-    return client, None
+    if _OPENAI_CLIENT is None or _OPENAI_CLIENT[0] != api_key:
+        _OPENAI_CLIENT = (api_key, OpenAI(api_key=api_key))
+    return _OPENAI_CLIENT[1], None
 
 def resolve_image_path_from_url(url: str | None) -> Path | None:
     """
@@ -38,19 +71,72 @@ def resolve_image_path_from_url(url: str | None) -> Path | None:
     static_prefix = "/static/"
     if url.startswith(static_prefix):
         rel = url[len(static_prefix):]
+        entry = get_asset(rel)
+        if entry:
+            return asset_fs_path(entry)
         return Path(settings.BASE_DIR) / "static" / rel
 
     return None
 
-def generate_tryon_image_with_openai(model_path: Path, clothing_paths: list[Path]):
+def acquire_image_slot(session_key, priority, quality, size, max_wait=None):
+    """
+    Wait for the image API scheduler; False means the queue is too long → fall
+    back now. Background calls made for a request still get a deadline
+    (IMAGE_API_MAX_BACKGROUND_WAIT); only offline jobs pass max_wait=inf.
+    """
+    if max_wait is None and priority == PRIORITY_BACKGROUND:
+        max_wait = getattr(settings, "IMAGE_API_MAX_BACKGROUND_WAIT", 30.0)
+    return get_image_scheduler().acquire(
+        session_key, priority, cost=estimate_image_tokens(quality, size), max_wait=max_wait
+    )
+
+TRYON_SIZE = "1024x1536"
+
+def tryon_render_key(model_path, clothing_paths):
+    """Cache key of a try-on: same base model + same garments (by content) → same render."""
+    hashes = [file_content_hash(p) for p in [model_path, *clothing_paths]]
+    if None in hashes:
+        return None
+    return canonical_key("tryon", hashes, getattr(settings, "OPENAI_IMAGE_MODEL", "gpt-image-1"))
+
+def tryon_media_name(render_key, quality):
+    return f"tryon/{render_key}_{quality}.png"
+
+def cached_tryon_url(render_key, quality):
+    """MEDIA_URL of an already rendered try-on at this quality, or None."""
+    if not render_key:
+        return None
+    filename = tryon_media_name(render_key, quality)
+    if (Path(settings.MEDIA_ROOT) / filename).exists():
+        return settings.MEDIA_URL + filename
+    return None
+
+def tryon_flight_key(model_path, clothing_paths, quality="high", **kwargs):
+    render_key = tryon_render_key(model_path, clothing_paths)
+    return f"{render_key}-{quality}" if render_key else None
+
+@timed_phase("tryon_image")
+@single_flight(tryon_flight_key)
+def generate_tryon_image_with_openai(model_path: Path, clothing_paths: list[Path],
+                                     session_key=None, priority=PRIORITY_INTERACTIVE, quality="high",
+                                     max_wait=None):
     """
     Use OpenAI gpt-image-1 to apply clothing images to the base model.
-    Returns (media_url, error).
+    Renders are cached on disk per (model, garments, quality); `max_wait` is
+    passed to acquire_image_slot. Returns (media_url, error).
     """
+    render_key = tryon_render_key(model_path, clothing_paths)
+    cached_url = cached_tryon_url(render_key, quality)
+    if cached_url:
+        return cached_url, None
+
     client, err = get_openai_client()
     if err:
         return None, err
 
+    if not acquire_image_slot(session_key, priority, quality, TRYON_SIZE, max_wait=max_wait):
+        return None, "Image service is busy right now; using base model only."
+
     prompt = (
         "Use the first image as the full-body base model. "
         "The other images are individual garments (tops or bottoms). "
@@ -77,8 +163,8 @@ def generate_tryon_image_with_openai(model_path: Path, clothing_paths: list[Path
             image=files,        # list of images: [base, garment1, garment2, ...]
             prompt=prompt,
             n=1,
-            size="1024x1536",
-            quality="high",
+            size=TRYON_SIZE,
+            quality=quality,
         )
     except Exception as e:
         msg = str(e)
@@ -100,7 +186,10 @@ def generate_tryon_image_with_openai(model_path: Path, clothing_paths: list[Path
         return None, f"OpenAI image response format error: {e}"
 
     image_bytes = base64.b64decode(b64)
-    filename = f"tryon/tryon_{get_random_string(12)}.png"
+    if render_key:
+        filename = tryon_media_name(render_key, quality)
+    else:
+        filename = f"tryon/tryon_{get_random_string(12)}.png"
     full_path = Path(settings.MEDIA_ROOT) / filename
     full_path.parent.mkdir(parents=True, exist_ok=True)
     with open(full_path, "wb") as f:
@@ -110,7 +199,15 @@ def generate_tryon_image_with_openai(model_path: Path, clothing_paths: list[Path
     return media_url, None
 
 # ======= Onboarding ========
-def generate_model_image_from_selfie(selfie_path: Path, gender: str):
+def selfie_flight_key(selfie_path, gender, **kwargs):
+    selfie_hash = file_content_hash(selfie_path)
+    if selfie_hash is None:
+        return None
+    return canonical_key("selfie", selfie_hash, (gender or "person").lower())
+
+@timed_phase("selfie_image")
+@single_flight(selfie_flight_key)
+def generate_model_image_from_selfie(selfie_path: Path, gender: str, session_key=None):
     """
     Use OpenAI gpt-image-1 to turn the selfie into a clean full-body model.
     Returns (media_url, error).
@@ -130,6 +227,9 @@ def generate_model_image_from_selfie(selfie_path: Path, gender: str):
         "Photorealistic, soft even lighting."
     )
 
+    if not acquire_image_slot(session_key, PRIORITY_INTERACTIVE, "high", "1024x1536"):
+        return None, "Image service is busy right now."
+
     try:
         img_file = open(selfie_path, "rb")
     except Exception as e:
@@ -183,27 +283,36 @@ def onboarding_view(request):
         request.session["user_gender"] = gender
 
         if selfie_file:
-            # 1) Save raw selfie
-            filename = f"selfies/{get_random_string(12)}_{selfie_file.name}"
-            path = default_storage.save(filename, selfie_file)
-            selfie_rel = filename.split("/", 1)[1]
-            selfie_fs_path = Path(settings.MEDIA_ROOT) / selfie_rel
-
-            # 2) Ask Gemini to create a clean model image
-            model_url, err = generate_model_image_from_selfie(selfie_fs_path, gender)
-            if model_url:
-                model_image_url = model_url
-            else:
-                # Fallback: use selfie directly if Gemini fails
-                model_image_url = settings.MEDIA_URL + selfie_rel
-                # Optionally stash error for dev
-                request.session["gemini_error"] = err
+            # 0) Same (or near-identical) selfie seen before → reuse its model
+            selfie_sha, selfie_dhash = hash_upload(selfie_file)
+            session_id = get_session_id(request.session)
+            model_image_url = find_model_for_selfie(selfie_sha, selfie_dhash, gender, session_id)
+
+            if not model_image_url:
+                # 1) Save raw selfie
+                filename = f"selfies/{get_random_string(12)}_{selfie_file.name}"
+                path = default_storage.save(filename, selfie_file)
+                selfie_rel = filename.split("/", 1)[1]
+                selfie_fs_path = Path(settings.MEDIA_ROOT) / selfie_rel
+
+                # 2) Ask Gemini to create a clean model image
+                model_url, err = generate_model_image_from_selfie(
+                    selfie_fs_path, gender, session_key=session_id
+                )
+                if model_url:
+                    model_image_url = model_url
+                    record_selfie_model(selfie_sha, selfie_dhash, gender, model_url, session_id)
+                else:
+                    # Fallback: use selfie directly if Gemini fails
+                    model_image_url = settings.MEDIA_URL + selfie_rel
+                    # Optionally stash error for dev
+                    request.session["gemini_error"] = err
         else:
             # No selfie → use default static image
             if gender.lower() == "female":
-                model_image_url = "/static/models/default_female_model.png"
+                model_image_url = DEFAULT_MODEL_URLS["female"]
             else:
-                model_image_url = "/static/models/default_male_model.png"
+                model_image_url = DEFAULT_MODEL_URLS["male"]
 
         request.session["model_image_url"] = model_image_url
         request.session.modified = True
@@ -214,10 +323,13 @@ def onboarding_view(request):
     return render(request, "core/onboarding.html")
 
 # ========= Outfit data loader =========
+def outfits_data_path() -> Path:
+    return Path(settings.BASE_DIR) / "core" / "data" / "streetwear_1_to_30_flat_keywords.json"
+
 def load_outfits():
     global _OUTFITS_CACHE
     if _OUTFITS_CACHE is None:
-        data_path = Path(settings.BASE_DIR) / "core" / "data" / "streetwear_1_to_30_flat_keywords.json"
+        data_path = outfits_data_path()
         with data_path.open(encoding="utf-8") as f:
             outfits = json.load(f)
 
@@ -229,6 +341,15 @@ def load_outfits():
     return _OUTFITS_CACHE
 
 # ========= Preference helpers =========
+def get_session_id(session):
+    """Stable random id for this browser session (signed-cookie sessions have no server-side key)."""
+    session_id = session.get("session_id")
+    if not session_id:
+        session_id = get_random_string(16)
+        session["session_id"] = session_id
+        session.modified = True
+    return session_id
+
 def get_preferences(session):
     """Return preferences dict from session, with default structure."""
     prefs = session.get("preferences")
@@ -248,23 +369,22 @@ def update_preferences_with_outfit(prefs, outfit):
     return prefs
 
 # ========= Product data loader =========
-def categorize_product(p):
+def products_data_path() -> Path:
+    return Path(settings.BASE_DIR) / "core" / "data" / "streetwear_products_combined.json"
+
+def read_products_file():
     """
-    Very lightweight category inference based on keywords/name.
-    We only need 'top' vs 'bottom' for now.
+    Parse the products JSON and attach static_path / category (uncached).
+    Categories come from the per-catalog-version index (core/categories.py).
     """
-    text = (p.get("name", "") + " " + " ".join(p.get("keywords", []))).lower()
+    with products_data_path().open(encoding="utf-8") as f:
+        products = json.load(f)
 
-    bottom_tokens = ["pants", "jeans", "cargo", "chino", "trousers"]
-    top_tokens = ["tshirt", "tee", "hoodie", "sweatshirt", "shirt", "jacket", "longsleeve"]
-
-    for token in bottom_tokens:
-        if token in text:
-            return "bottom"
-    for token in top_tokens:
-        if token in text:
-            return "top"
-    return None
+    categories = load_category_index(get_catalog_version(), products)["categories"]
+    for p, category in zip(products, categories):
+        p["static_path"] = f"products/{p['id']}.png"
+        p["category"] = category
+    return products
 
 def load_products():
     """
@@ -273,18 +393,223 @@ def load_products():
     """
     global _PRODUCTS_CACHE
     if _PRODUCTS_CACHE is None:
-        data_path = Path(settings.BASE_DIR) / "core" / "data" / "streetwear_products_combined.json"
-        with data_path.open(encoding="utf-8") as f:
-            products = json.load(f)
+        if use_compact_catalog():
+            # shared mmap'd columns instead of a per-worker list of dicts
+            products = load_compact_catalog(get_catalog_version(), read_products_file)
+        else:
+            products = read_products_file()
 
-        for p in products:
-            p["static_path"] = f"products/{p['id']}.png"
-            p["category"] = categorize_product(p)
+        # warm the asset manifest with the catalog so views don't stat() or hash images
+        load_asset_manifest()
 
         _PRODUCTS_CACHE = products
     return _PRODUCTS_CACHE
 
+def get_products_by_ids(ids):
+    """{id: product} for the given IDs, from whichever catalog backend is active."""
+    global _PRODUCTS_BY_ID
+    if use_sqlite_catalog():
+        return catalog_db.get_products_by_ids(ids)
+    if use_compact_catalog():
+        return load_products().get_by_ids(ids)
+    if _PRODUCTS_BY_ID is None:
+        _PRODUCTS_BY_ID = {p["id"]: p for p in load_products()}
+    return {i: _PRODUCTS_BY_ID[i] for i in ids if i in _PRODUCTS_BY_ID}
+
+def get_catalog_version():
+    """
+    Content hash of the product + outfit files and the category classifier;
+    changes whenever any of them does.
+    """
+    global _CATALOG_VERSION
+    if _CATALOG_VERSION is None:
+        digest = hashlib.sha256(CLASSIFIER_VERSION.encode())
+        for data_path in (products_data_path(), outfits_data_path()):
+            digest.update(data_path.read_bytes())
+        _CATALOG_VERSION = digest.hexdigest()[:16]
+    return _CATALOG_VERSION
+
+# ========= Catalog queries =========
+def use_sqlite_catalog():
+    return getattr(settings, "CATALOG_BACKEND", "json") == "sqlite"
+
+def use_compact_catalog():
+    return getattr(settings, "CATALOG_BACKEND", "json") == "compact"
+
+def use_tfidf_ranking():
+    return getattr(settings, "CATALOG_RANKING", "keywords") == "tfidf"
+
+@timed_phase("catalog")
+def score_catalog(kw_counts, category=None, limit=None, offset=0, positive_only=False):
+    """
+    Products ranked by keyword overlap with the user's likes (score desc, then name).
+    With CATALOG_RANKING = "tfidf" the ranking is cosine similarity from the
+    vector index instead. Otherwise served from the sqlite index when
+    CATALOG_BACKEND = "sqlite", from the shared columnar file when "compact",
+    or by scanning the in-memory JSON catalog.
+    """
+    if use_tfidf_ranking():
+        # approximate nearest neighbours in the shared TF-IDF space
+        products_loader = load_products if getattr(settings, "CATALOG_BACKEND", "json") == "json" else read_products_file
+        if use_sqlite_catalog():
+            catalog_db.ensure_catalog_index(get_catalog_version(), read_products_file)
+        index = load_vector_index(get_catalog_version(), products_loader, load_outfits)
+        hits = index.nearest(kw_counts, limit, category=category, offset=offset, positive_only=positive_only)
+        by_id = get_products_by_ids([pid for pid, score in hits])
+        return [by_id[pid] for pid, score in hits if pid in by_id]
+
+    if use_sqlite_catalog():
+        catalog_db.ensure_catalog_index(get_catalog_version(), read_products_file)
+        return catalog_db.query_scored_products(
+            kw_counts, category=category, limit=limit, offset=offset, positive_only=positive_only
+        )
+
+    if use_compact_catalog():
+        return load_products().score(
+            kw_counts, category=category, limit=limit, offset=offset, positive_only=positive_only
+        )
+
+    # rows of the requested category, already in name order
+    products = load_products()
+    rows = category_rows(load_category_index(get_catalog_version(), products), category)
+    end = None if limit is None else offset + limit
+    if not kw_counts and not positive_only:
+        return [products[row] for row in rows[offset:end]]
+
+    scored = []
+    for row in rows:
+        p = products[row]
+        score = sum(kw_counts.get(kw, 0) for kw in p.get("keywords", []))
+        if positive_only and score <= 0:
+            continue
+        scored.append((score, p))
+
+    # stable sort: equal scores stay in name order
+    scored.sort(key=lambda sp: -sp[0])
+    return [p for score, p in scored[offset:end]]
+
+def candidate_pool_size():
+    # the JSON backend keeps the whole ranked category; sqlite / ANN return top-k only
+    if use_sqlite_catalog() or use_tfidf_ranking():
+        return getattr(settings, "CATALOG_POOL_SIZE", 50)
+    return None
+
+def garment_paths_for(products):
+    """Filesystem paths of the nano<ID>.png garment cutouts that exist for these products."""
+    paths = []
+    for p in products:
+        # clothing image is static/products/nano<ID>.png
+        garment = get_garment_asset(p["id"])
+        if garment:
+            paths.append(asset_fs_path(garment))
+    return paths
+
+def garment_layers_for(products):
+    """(category, path) pairs for the local compositor."""
+    layers = []
+    for p in products:
+        garment = get_garment_asset(p["id"])
+        if garment:
+            layers.append((outfit_slot(p.get("category")), asset_fs_path(garment)))
+    return layers
+
+# ======= Pre-rendered try-ons (default models) =======
+def prerendered_manifest_path() -> Path:
+    return Path(settings.BASE_DIR) / "core" / "data" / "prerendered_tryons.json"
+
+def prerendered_combo_key(top_id, bottom_id):
+    return f"{top_id}+{bottom_id}"
+
+def load_prerendered_tryons():
+    """
+    Load the manifest written by `manage.py prerender_tryons`.
+    Shape: {"<default model stem>": {"<top_id>+<bottom_id>": "<static rel path>"}}
+    """
+    global _PRERENDERED_CACHE
+    if _PRERENDERED_CACHE is None:
+        manifest_path = prerendered_manifest_path()
+        try:
+            with manifest_path.open(encoding="utf-8") as f:
+                _PRERENDERED_CACHE = json.load(f)
+        except (OSError, ValueError):
+            _PRERENDERED_CACHE = {}
+    return _PRERENDERED_CACHE
+
+def lookup_prerendered_tryon(model_image_url, top_id, bottom_id):
+    """
+    Return the static URL of a pre-rendered try-on for a default model,
+    or None if the user has their own model or the combo wasn't rendered.
+    """
+    if model_image_url not in DEFAULT_MODEL_URLS.values():
+        return None
+    model_key = Path(model_image_url).stem
+    rel = load_prerendered_tryons().get(model_key, {}).get(prerendered_combo_key(top_id, bottom_id))
+    if not rel:
+        return None
+    return static(rel)
+
 # ======= Nosana outfit generation =======
+# Everything up to and including the catalog is shared between users with the
+# same candidate pool, so it goes first: the inference server can then reuse
+# its prefix cache. Per-user content (style keywords, repeats to avoid) goes last.
+STYLIST_SYSTEM_PROMPT = (
+    "You are a streetwear stylist AI for an e-commerce app. "
+    "Choose exactly one item with category 'top' and one with category 'bottom' "
+    "from the catalog that best match the user's style. Only use IDs from the catalog.\n"
+    "Catalog lines are: id|category|name|price|keywords.\n"
+    "Reply with ONLY this JSON object, no markdown, no extra text:\n"
+    '{"top_id":"<id>","bottom_id":"<id>","outfit_name":"<short creative name>",'
+    '"style_notes":"<one or two sentences on why it works>"}'
+)
+
+def compact_catalog(items):
+    """
+    One line per item instead of pretty JSON. Sorted by id so the same
+    candidate pool always encodes to the same bytes.
+    """
+    lines = []
+    for p in sorted(items, key=lambda p: p["id"]):
+        price = p.get("price")
+        price_text = f"{price:g}{p.get('currency') or ''}" if price is not None else ""
+        keywords = ",".join((p.get("keywords", []) or [])[:3])
+        lines.append(f"{p['id']}|{p.get('category') or ''}|{p['name']}|{price_text}|{keywords}")
+    return "\n".join(lines)
+
+def build_stylist_messages(catalog, top_prefs, last_top_id=None, last_bottom_id=None):
+    """Chat messages for the stylist LLM: stable prefix first, per-user tail last."""
+    user_parts = [
+        "Catalog:",
+        compact_catalog(catalog),
+        "",
+        f"User style keywords (most important first): {', '.join(top_prefs) if top_prefs else 'none'}.",
+    ]
+    if last_top_id:
+        user_parts.append(f"Do not reuse top {last_top_id} if possible.")
+    if last_bottom_id:
+        user_parts.append(f"Do not reuse bottom {last_bottom_id} if possible.")
+
+    return [
+        {"role": "system", "content": STYLIST_SYSTEM_PROMPT},
+        {"role": "user", "content": "\n".join(user_parts)},
+    ]
+
+def top_style_keywords(prefs, n=5):
+    kw_counts = prefs.get("keywords", {})
+    sorted_kw = sorted(kw_counts.items(), key=lambda x: x[1], reverse=True)
+    return [kw for kw, c in sorted_kw[:n]]
+
+def nosana_flight_key(tops, bottoms, prefs, last_top_id=None, last_bottom_id=None):
+    return canonical_key(
+        "nosana",
+        [p["id"] for p in tops],
+        [p["id"] for p in bottoms],
+        top_style_keywords(prefs),
+        last_top_id,
+        last_bottom_id,
+    )
+
+@timed_phase("nosana")
+@single_flight(nosana_flight_key)
 def generate_outfit_with_nosana(tops, bottoms, prefs, last_top_id=None, last_bottom_id=None):
     """
     Ask the Nosana-hosted LLM to pick one top + one bottom.
@@ -322,60 +647,18 @@ def generate_outfit_with_nosana(tops, bottoms, prefs, last_top_id=None, last_bot
     tops_small = tops[:4]
     bottoms_small = bottoms[:4]
 
-    def simplify(p):
-        return {
-            "id": p["id"],
-            "name": p["name"],
-            "category": p.get("category"),
-            "price": p.get("price"),
-            "currency": p.get("currency"),
-            "keywords": (p.get("keywords", []) or [])[:3],
-        }
-
-    catalog = [simplify(p) for p in tops_small + bottoms_small]
-
-    kw_counts = prefs.get("keywords", {})
-    sorted_kw = sorted(kw_counts.items(), key=lambda x: x[1], reverse=True)
-    top_prefs = [kw for kw, c in sorted_kw[:5]]
-
-    system_msg = (
-        "You are a streetwear stylist AI for an e-commerce app. "
-        "You must choose exactly one TOP and one BOTTOM item from the given catalog. "
-        "Only use item IDs that exist in the catalog."
-    )
+    catalog = tops_small + bottoms_small
 
-    avoid_text_parts = []
-    if last_top_id:
-        avoid_text_parts.append(f"Do not reuse this top ID if possible: {last_top_id}.")
-    if last_bottom_id:
-        avoid_text_parts.append(f"Do not reuse this bottom ID if possible: {last_bottom_id}.")
-    avoid_text = (" ".join(avoid_text_parts) + "\n") if avoid_text_parts else ""
-
-    user_msg = (
-        avoid_text +
-        "User style keywords (most important first): "
-        f"{top_prefs if top_prefs else 'none'}.\n\n"
-        "Catalog items (JSON list):\n"
-        f"{json.dumps(catalog, ensure_ascii=False)}\n\n"
-        "Pick exactly one item with category 'top' and one item with category 'bottom' "
-        "that best match the user's style. Return ONLY a JSON object with this format:\n"
-        "{\n"
-        '  \"top_id\": \"<id of chosen top>\",\n'
-        '  \"bottom_id\": \"<id of chosen bottom>\",\n'
-        '  \"outfit_name\": \"<short creative name for the outfit>\",\n'
-        '  \"style_notes\": \"<one or two sentences describing why this works>\"\n'
-        "}\n"
-        "No extra text, no markdown."
-    )
+    top_prefs = top_style_keywords(prefs)
 
     payload = {
         "model": model_name,
-        "messages": [
-            {"role": "system", "content": system_msg},
-            {"role": "user", "content": user_msg},
-        ],
+        "messages": build_stylist_messages(catalog, top_prefs, last_top_id, last_bottom_id),
         "temperature": 0.7,
     }
+    max_tokens = getattr(settings, "NOSANA_MAX_TOKENS", None)
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
 
     headers = {
         "Content-Type": "application/json",
@@ -387,6 +670,13 @@ def generate_outfit_with_nosana(tops, bottoms, prefs, last_top_id=None, last_bot
         resp.raise_for_status()
         data = resp.json()
         content = data["choices"][0]["message"]["content"]
+        usage = data.get("usage") or {}
+        logger.info(
+            "Nosana stylist call: prompt_tokens=%s completion_tokens=%s cached_tokens=%s",
+            usage.get("prompt_tokens"),
+            usage.get("completion_tokens"),
+            (usage.get("prompt_tokens_details") or {}).get("cached_tokens"),
+        )
     except Exception as e:
         top_id, bottom_id, name, notes, _ = simple_fallback()
         return top_id, bottom_id, name, notes, f"Nosana call failed: {e}"
@@ -433,28 +723,34 @@ def generate_outfit_with_nosana(tops, bottoms, prefs, last_top_id=None, last_bot
     return top_id, bottom_id, outfit_name, style_notes, None
 
 # ======= Production Views (= Parsa Styling) ========
+MYSTORE_PAGE_SIZE = 24
+
 def mystore_view(request):
-    products = load_products()
     prefs = get_preferences(request.session)
     kw_counts = prefs.get("keywords", {})
 
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+
     if not kw_counts:
         # No preferences yet → empty shop
         top_products = []
+        has_next = False
     else:
-        # score products by keyword overlap
-        scored = []
-        for p in products:
-            score = sum(kw_counts.get(kw, 0) for kw in p.get("keywords", []))
-            if score > 0:
-                scored.append((score, p))
-
-        scored.sort(key=lambda sp: (-sp[0], sp[1]["name"]))
-        top_products = [p for score, p in scored[:24]]
+        # score products by keyword overlap; fetch one extra to know if there's a next page
+        top_products = score_catalog(
+            kw_counts, limit=MYSTORE_PAGE_SIZE + 1, offset=(page - 1) * MYSTORE_PAGE_SIZE, positive_only=True
+        )
+        has_next = len(top_products) > MYSTORE_PAGE_SIZE
+        top_products = top_products[:MYSTORE_PAGE_SIZE]
 
     context = {
         "products": top_products,
         "has_preferences": bool(kw_counts),
+        "page": page,
+        "has_next": has_next,
     }
     return render(request, "core/mystore.html", context)
 
@@ -483,6 +779,8 @@ def swipe_view(request):
         # Apply preference update only if there is a current outfit
         if 0 <= idx < total:
             current_outfit = outfits[idx]
+            if action in ("like", "dislike"):
+                record_swipe(get_session_id(request.session), current_outfit.get("id"), action)
             if action == "like":
                 prefs = update_preferences_with_outfit(prefs, current_outfit)
                 save_preferences(request.session, prefs)
@@ -526,7 +824,6 @@ def outfits_view(request):
     if not model_image_url:
         return redirect("onboarding")
 
-    products = load_products()
     prefs = get_preferences(request.session)
     kw_counts = prefs.get("keywords", {})
 
@@ -541,19 +838,11 @@ def outfits_view(request):
         }
         return render(request, "core/outfits.html", context)
 
-    # Score all products (no filtering on score > 0)
-    scored = []
-    for p in products:
-        score = sum(kw_counts.get(kw, 0) for kw in p.get("keywords", []))
-        scored.append((score, p))
-
+    # Score products per category (no filtering on score > 0)
     # Deterministic order: score desc, then name
-    scored.sort(key=lambda sp: (-sp[0], sp[1]["name"]))
-    relevant_products = [p for score, p in scored]
-
-    # Split into tops/bottoms based on category
-    tops = [p for p in relevant_products if p.get("category") == "top"]
-    bottoms = [p for p in relevant_products if p.get("category") == "bottom"]
+    pool_size = candidate_pool_size()
+    tops = score_catalog(kw_counts, category=OUTFIT_SLOTS["top"], limit=pool_size)
+    bottoms = score_catalog(kw_counts, category=OUTFIT_SLOTS["bottom"], limit=pool_size)
 
     # Last chosen IDs from previous outfit (for diversity)
     last_ids = request.session.get("last_outfit_ids") or {}
@@ -568,7 +857,8 @@ def outfits_view(request):
     total_price = 0
     currency = None
 
-    prod_by_id = {p["id"]: p for p in products}
+    # chosen IDs always come from the candidate pools
+    prod_by_id = {p["id"]: p for p in tops + bottoms}
 
     if top_id and top_id in prod_by_id:
         p = prod_by_id[top_id]
@@ -608,27 +898,31 @@ def outfits_view(request):
 
 # ======= Sandbox Views (= Mehmet Logic) ========
 def mystore_view_dev(request):
-    products = load_products()
     prefs = get_preferences(request.session)
     kw_counts = prefs.get("keywords", {})
 
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+
     if not kw_counts:
         # No preferences yet → empty shop
         top_products = []
+        has_next = False
     else:
-        # score products by keyword overlap
-        scored = []
-        for p in products:
-            score = sum(kw_counts.get(kw, 0) for kw in p.get("keywords", []))
-            if score > 0:
-                scored.append((score, p))
-
-        scored.sort(key=lambda sp: (-sp[0], sp[1]["name"]))
-        top_products = [p for score, p in scored[:24]]
+        # score products by keyword overlap; fetch one extra to know if there's a next page
+        top_products = score_catalog(
+            kw_counts, limit=MYSTORE_PAGE_SIZE + 1, offset=(page - 1) * MYSTORE_PAGE_SIZE, positive_only=True
+        )
+        has_next = len(top_products) > MYSTORE_PAGE_SIZE
+        top_products = top_products[:MYSTORE_PAGE_SIZE]
 
     context = {
         "products": top_products,
         "has_preferences": bool(kw_counts),
+        "page": page,
+        "has_next": has_next,
     }
     return render(request, "sandbox/mystore_logic.html", context)
 
@@ -657,6 +951,8 @@ def swipe_view_dev(request):
         # Apply preference update only if there is a current outfit
         if 0 <= idx < total:
             current_outfit = outfits[idx]
+            if action in ("like", "dislike"):
+                record_swipe(get_session_id(request.session), current_outfit.get("id"), action)
             if action == "like":
                 prefs = update_preferences_with_outfit(prefs, current_outfit)
                 save_preferences(request.session, prefs)
@@ -700,7 +996,6 @@ def outfits_view_dev(request):
     if not model_image_url:
         return redirect("onboarding")
 
-    products = load_products()
     prefs = get_preferences(request.session)
     kw_counts = prefs.get("keywords", {})
 
@@ -715,17 +1010,10 @@ def outfits_view_dev(request):
         }
         return render(request, "sandbox/outfits_logic.html", context)
 
-    # Score all products
-    scored = []
-    for p in products:
-        score = sum(kw_counts.get(kw, 0) for kw in p.get("keywords", []))
-        scored.append((score, p))
-
-    scored.sort(key=lambda sp: (-sp[0], sp[1]["name"]))
-    relevant_products = [p for score, p in scored]
-
-    tops = [p for p in relevant_products if p.get("category") == "top"]
-    bottoms = [p for p in relevant_products if p.get("category") == "bottom"]
+    # Score products per category
+    pool_size = candidate_pool_size()
+    tops = score_catalog(kw_counts, category=OUTFIT_SLOTS["top"], limit=pool_size)
+    bottoms = score_catalog(kw_counts, category=OUTFIT_SLOTS["bottom"], limit=pool_size)
 
     last_ids = request.session.get("last_outfit_ids") or {}
     last_top_id = last_ids.get("top_id")
@@ -739,7 +1027,8 @@ def outfits_view_dev(request):
     total_price = 0
     currency = None
 
-    prod_by_id = {p["id"]: p for p in products}
+    # chosen IDs always come from the candidate pools
+    prod_by_id = {p["id"]: p for p in tops + bottoms}
 
     if top_id and top_id in prod_by_id:
         p = prod_by_id[top_id]
@@ -778,34 +1067,65 @@ def outfits_view_dev(request):
 
     outfit_ids_changed = (top_id != prev_top_id) or (bottom_id != prev_bottom_id)
 
+    prerendered_url = None
     if outfit_ids_changed and outfit_products:
+        prerendered_url = lookup_prerendered_tryon(model_image_url, top_id, bottom_id)
+
+    if prerendered_url:
+        # default model + known combo → served as a static file, no API call
+        tryon_image_url = prerendered_url
+        request.session["last_tryon"] = {
+            "top_id": top_id,
+            "bottom_id": bottom_id,
+            "image_url": prerendered_url,
+        }
+        request.session.modified = True
+    elif outfit_ids_changed and outfit_products:
         base_model_path = resolve_image_path_from_url(model_image_url)
-        clothing_paths = []
-
-        for p in outfit_products:
-            # clothing image is static/products/nano<ID>.png
-            nano_rel = f"products/nano{p['id']}.png"
-            nano_fs = Path(settings.BASE_DIR) / "static" / nano_rel
-            if nano_fs.exists():
-                clothing_paths.append(nano_fs)
+        clothing_paths = garment_paths_for(outfit_products)
 
         if base_model_path and clothing_paths:
-            img_url, img_err = generate_tryon_image_with_openai(base_model_path, clothing_paths)
+            render_key = tryon_render_key(base_model_path, clothing_paths)
+            img_url, quality, img_err = None, None, None
+            for cached_quality in ("high", "low"):
+                img_url = cached_tryon_url(render_key, cached_quality)
+                if img_url:
+                    quality = cached_quality
+                    break
+
+            if not img_url and getattr(settings, "TRYON_PLACEHOLDER", True):
+                # local composite right away; the page fetches the AI render (tryon_upgrade_view_dev)
+                img_url, img_err = compose_tryon_preview(base_model_path, garment_layers_for(outfit_products))
+                quality = "preview"
+
+            if not img_url:
+                # progressive: a quick low-quality render first, the page asks for the
+                # high-quality one once the user lingers (tryon_upgrade_view_dev)
+                quality = "low" if getattr(settings, "TRYON_PROGRESSIVE", True) else "high"
+                img_url, img_err = generate_tryon_image_with_openai(
+                    base_model_path, clothing_paths, session_key=get_session_id(request.session), quality=quality
+                )
+                if not img_url:
+                    # API busy or failing: the local composite beats the bare base model
+                    img_url, _ = compose_tryon_preview(base_model_path, garment_layers_for(outfit_products))
+                    quality = "fallback"
+
             if img_url:
                 tryon_image_url = img_url
                 request.session["last_tryon"] = {
                     "top_id": top_id,
                     "bottom_id": bottom_id,
                     "image_url": img_url,
+                    "quality": quality,
                 }
                 request.session.modified = True
-            else:
-                if img_err:
-                    if error:
-                        error = error + " | " + img_err
-                    else:
-                        error = img_err
+            if img_err:
+                if error:
+                    error = error + " | " + img_err
+                else:
+                    error = img_err
 
+    last_tryon = request.session.get("last_tryon") or {}
     context = {
         "model_image_url": model_image_url,
         "first_name": first_name,
@@ -813,5 +1133,95 @@ def outfits_view_dev(request):
         "outfit": outfit,
         "error": error,
         "tryon_image_url": tryon_image_url,
+        "tryon": last_tryon,
+        "tryon_upgrade_after_ms": tryon_upgrade_delay_ms(last_tryon.get("quality")) if tryon_image_url else None,
     }
-    return render(request, "sandbox/outfits_logic.html", context)
\ No newline at end of file
+    return render(request, "sandbox/outfits_logic.html", context)
+
+def next_tryon_quality(quality):
+    """The render that replaces a try-on of this quality: preview → low → high (None when final)."""
+    if quality == "preview":
+        return "low" if getattr(settings, "TRYON_PROGRESSIVE", True) else "high"
+    if quality == "low":
+        return "high"
+    return None
+
+def tryon_upgrade_delay_ms(quality):
+    """When the page should ask for the next render, or None if there is none."""
+    next_quality = next_tryon_quality(quality)
+    if next_quality is None:
+        return None
+    if next_quality == "high" and quality == "low":
+        # only spend a high-quality render on outfits the user actually looks at
+        return getattr(settings, "TRYON_UPGRADE_DELAY_MS", 3000)
+    return 0
+
+def tryon_upgrade_view_dev(request):
+    """
+    Render the next quality step of the try-on the page is showing (local
+    preview → AI render, low → high). The outfits page posts its top_id,
+    bottom_id and quality, swaps the image in and posts again with the
+    returned quality; returns {"image_url", "quality", "upgrade_after_ms"}.
+
+    The session isn't written here: with signed-cookie sessions that would
+    send back a cookie that may already be stale.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+
+    last_tryon = request.session.get("last_tryon") or {}
+    top_id, bottom_id = request.POST.get("top_id"), request.POST.get("bottom_id")
+    if (top_id, bottom_id) != (last_tryon.get("top_id"), last_tryon.get("bottom_id")):
+        # the user has moved on to another outfit since this page was rendered
+        return JsonResponse({"image_url": None, "quality": None, "upgrade_after_ms": None})
+
+    shown_quality = request.POST.get("quality")
+    quality = next_tryon_quality(shown_quality)
+    if quality is None:
+        return JsonResponse({"image_url": None, "quality": shown_quality, "upgrade_after_ms": None})
+
+    base_model_path = resolve_image_path_from_url(request.session.get("model_image_url"))
+    products = get_products_by_ids([top_id, bottom_id])
+    clothing_paths = garment_paths_for(products.values())
+    if not base_model_path or not clothing_paths:
+        return JsonResponse({"error": "Nothing to upgrade."}, status=400)
+
+    # the first AI render replaces a placeholder the user is looking at now;
+    # the high-quality upgrade can wait behind other users' first renders
+    priority = PRIORITY_INTERACTIVE if shown_quality == "preview" else PRIORITY_BACKGROUND
+    img_url, img_err = generate_tryon_image_with_openai(
+        base_model_path,
+        clothing_paths,
+        session_key=get_session_id(request.session),
+        priority=priority,
+        quality=quality,
+    )
+    if not img_url:
+        return JsonResponse({"error": img_err}, status=503)
+
+    return JsonResponse({"image_url": img_url, "quality": quality, "upgrade_after_ms": tryon_upgrade_delay_ms(quality)})
+
+def warmup_view(request):
+    """
+    Preload catalogs, indexes, templates and clients for a scheduled ping;
+    returns the per-step timings. With WARMUP_TOKEN set, the ping must send
+    it as `Authorization: Bearer <token>` or ?token=. Without it the endpoint
+    is public, so step errors are only logged, not returned.
+    """
+    from .warmup import run_warmup
+
+    token = getattr(settings, "WARMUP_TOKEN", "")
+    if token:
+        sent = request.GET.get("token") or request.META.get("HTTP_AUTHORIZATION", "").removeprefix("Bearer ")
+        if not constant_time_compare(sent, token):
+            return JsonResponse({"error": "forbidden"}, status=403)
+
+    steps = run_warmup()
+    if not token:
+        steps = [{"step": step["step"], "ms": step["ms"]} for step in steps]
+        return JsonResponse({"total_ms": round(sum(step["ms"] for step in steps), 2), "steps": steps})
+    return JsonResponse({
+        "ok": all(step["error"] is None for step in steps),
+        "total_ms": round(sum(step["ms"] for step in steps), 2),
+        "steps": steps,
+    })
\ No newline at end of file
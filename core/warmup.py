@@ -0,0 +1,99 @@
+"""
+Eagerly build everything the first request would otherwise build lazily:
+catalogs and their indexes, manifests, compiled templates, the compositor's
+default models (with TRYON_PLACEHOLDER on), the image scheduler and the
+shared OpenAI client.
+
+`run_warmup()` is called from api/index.py when the serverless function
+starts (WARMUP_ON_START), by `manage.py warmup`, and by the /warmup/
+endpoint for scheduled pings. Every step is timed; a failing step is
+reported and the rest still run. Steps hit the module caches, so a second
+run on a warm process costs close to nothing.
+"""
+from django.conf import settings
+from django.template.loader import get_template
+from pathlib import Path
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _templates():
+    for template_dir in settings.TEMPLATES[0].get("DIRS", []):
+        base = Path(template_dir)
+        for path in sorted(base.rglob("*.html")):
+            get_template(path.relative_to(base).as_posix())
+
+def _catalog_backend():
+    from . import catalog_db
+    from .views import get_catalog_version, read_products_file, use_sqlite_catalog
+
+    if use_sqlite_catalog():
+        catalog_db.ensure_catalog_index(get_catalog_version(), read_products_file)
+
+def _vector_index():
+    from .views import get_catalog_version, load_outfits, load_products, read_products_file, use_tfidf_ranking
+    from .vectors import load_vector_index
+
+    if use_tfidf_ranking():
+        products_loader = load_products if getattr(settings, "CATALOG_BACKEND", "json") == "json" else read_products_file
+        load_vector_index(get_catalog_version(), products_loader, load_outfits)
+
+def _products_by_id():
+    from .views import get_products_by_ids
+
+    get_products_by_ids([])
+
+def _default_models():
+    from .compositor import load_model
+    from .views import DEFAULT_MODEL_URLS, resolve_image_path_from_url
+
+    for url in DEFAULT_MODEL_URLS.values():
+        path = resolve_image_path_from_url(url)
+        if path:
+            load_model(path)
+
+def _openai_client():
+    from .views import get_openai_client
+
+    client, err = get_openai_client()
+    if err:
+        raise RuntimeError(err)
+
+def warmup_steps():
+    from .assets import load_asset_manifest
+    from .image_scheduler import get_image_scheduler
+    from .views import get_catalog_version, load_outfits, load_prerendered_tryons, load_products
+
+    steps = [
+        ("catalog_version", get_catalog_version),
+        ("asset_manifest", load_asset_manifest),
+        ("products", load_products),
+        ("outfits", load_outfits),
+        ("products_by_id", _products_by_id),
+        ("catalog_backend", _catalog_backend),
+        ("vector_index", _vector_index),
+        ("prerendered_manifest", load_prerendered_tryons),
+        ("templates", _templates),
+        ("image_scheduler", get_image_scheduler),
+        ("openai_client", _openai_client),
+    ]
+    # without placeholders the compositor is only an API-failure fallback; let that path load lazily
+    if getattr(settings, "TRYON_PLACEHOLDER", True):
+        steps.insert(-2, ("compositor_models", _default_models))
+    return steps
+
+def run_warmup():
+    """Run every step; returns [{"step", "ms", "error"}] in order."""
+    report = []
+    for name, step in warmup_steps():
+        start = time.perf_counter()
+        error = None
+        try:
+            step()
+        except Exception as e:
+            error = str(e)
+            logger.warning("Warmup step %s failed: %s", name, e)
+        report.append({"step": name, "ms": round((time.perf_counter() - start) * 1000, 2), "error": error})
+    return report
@@ -15,9 +15,70 @@ from pathlib import Path
 NOSANA_BASE_URL = os.environ.get("NOSANA_BASE_URL", "")
 NOSANA_MODEL_NAME = os.environ.get("NOSANA_MODEL_NAME", "")
 NOSANA_API_KEY = os.environ.get("NOSANA_API_KEY", "foo")
+# optional cap on stylist completion length; unset = the server's default.
+# Reasoning models (gpt-oss-20b) count their thinking here too, so a cap has
+# to leave room for that plus the JSON reply or the JSON gets cut off.
+NOSANA_MAX_TOKENS = int(os.environ["NOSANA_MAX_TOKENS"]) if os.environ.get("NOSANA_MAX_TOKENS") else None
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 OPENAI_IMAGE_MODEL = "gpt-image-1"
+# Local budget for images.edit calls, per process (see core/image_scheduler.py);
+# prerender_tryons gets its own share with --rpm, not counted in this one.
+# TPM counts estimated output image tokens; 0 disables that bucket.
+IMAGE_API_RPM = int(os.environ.get("IMAGE_API_RPM", "20"))
+IMAGE_API_TPM = int(os.environ.get("IMAGE_API_TPM", "0"))
+# interactive calls that would queue longer than this fall back immediately
+IMAGE_API_MAX_QUEUE_WAIT = float(os.environ.get("IMAGE_API_MAX_QUEUE_WAIT", "20"))
+# same for background-priority calls made by a request (the high-quality
+# upgrade); only offline jobs like prerender_tryons wait without a limit
+IMAGE_API_MAX_BACKGROUND_WAIT = float(os.environ.get("IMAGE_API_MAX_BACKGROUND_WAIT", "30"))
+# Show a fast low-quality try-on first; the page requests the high-quality
+# render after the user has looked at the outfit for TRYON_UPGRADE_DELAY_MS.
+TRYON_PROGRESSIVE = os.environ.get("TRYON_PROGRESSIVE", "1") == "1"
+TRYON_UPGRADE_DELAY_MS = int(os.environ.get("TRYON_UPGRADE_DELAY_MS", "3000"))
+# Serve a local Pillow composite (core/compositor.py) instantly and fetch the
+# AI render from the page; it also replaces the bare model when the API fails.
+TRYON_PLACEHOLDER = os.environ.get("TRYON_PLACEHOLDER", "1") == "1"
+
+# Selfies whose 64-bit dHash is within this many bits of an earlier one (same
+# gender) reuse that selfie's generated model instead of a new image edit.
+SELFIE_DHASH_MAX_DISTANCE = int(os.environ.get("SELFIE_DHASH_MAX_DISTANCE", "6"))
+# Oldest recorded selfies are forgotten beyond this many.
+SELFIE_INDEX_MAX_ENTRIES = int(os.environ.get("SELFIE_INDEX_MAX_ENTRIES", "10000"))
+
+# Identical concurrent Nosana / image calls share one upstream request per process.
+# Set a directory to also coalesce across worker processes (flock + short-lived result files).
+SINGLE_FLIGHT_LOCK_DIR = os.environ.get("SINGLE_FLIGHT_LOCK_DIR", "")
+SINGLE_FLIGHT_RESULT_TTL = int(os.environ.get("SINGLE_FLIGHT_RESULT_TTL", "120"))
+
+# Swipe events are buffered in memory and bulk-inserted into the swipe_event
+# table of the sqlite file SWIPE_LOG_PATH by a background thread
+# (core/swipe_log.py). Off by default: the deploy's filesystem is read-only
+# apart from /tmp, so point SWIPE_LOG_PATH somewhere writable when enabling it.
+SWIPE_LOG_ENABLED = os.environ.get("SWIPE_LOG_ENABLED", "0") == "1"
+SWIPE_LOG_PATH = os.environ.get("SWIPE_LOG_PATH", "/tmp/stylemaxx-swipes.sqlite3")
+SWIPE_LOG_BUFFER_SIZE = int(os.environ.get("SWIPE_LOG_BUFFER_SIZE", "10000"))
+SWIPE_LOG_BATCH_SIZE = int(os.environ.get("SWIPE_LOG_BATCH_SIZE", "200"))
+SWIPE_LOG_FLUSH_INTERVAL = float(os.environ.get("SWIPE_LOG_FLUSH_INTERVAL", "5"))
+
+# Opt-in request profiling (core/profiling.py). With PROFILE_REQUESTS on, requests
+# to core views carrying a token from `manage.py profile_token` (X-Profile header
+# or ?_profile=) are profiled, plus a random PROFILE_SAMPLE_RATE fraction.
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/stylemaxx-profiles")
+PROFILE_TOKEN_MAX_AGE = int(os.environ.get("PROFILE_TOKEN_MAX_AGE", "3600"))
+# Signs profile tokens (SECRET_KEY has a public default). Unset: tokens are ignored.
+PROFILE_SECRET = os.environ.get("PROFILE_SECRET", "")
+# "cprofile", or "pyinstrument" (sampling) when that package is installed
+PROFILE_ENGINE = os.environ.get("PROFILE_ENGINE", "cprofile")
+
+# Preload catalogs, indexes, templates and the OpenAI client when the serverless
+# function starts (api/index.py). /warmup/ does the same for scheduled pings and,
+# if WARMUP_TOKEN is set, requires it (Authorization: Bearer <token> or ?token=);
+# without it, /warmup/ only returns step names and timings.
+WARMUP_ON_START = os.environ.get("WARMUP_ON_START", "1") == "1"
+WARMUP_TOKEN = os.environ.get("WARMUP_TOKEN", "")
 
 # for constructing selfie URLs (if deployed):
 PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "http://127.0.0.1:8000")
@@ -52,6 +113,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # outermost, so a profile covers the other middleware too
+    "core.profiling.RequestProfilerMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -93,6 +156,18 @@ DATABASES = {
 }
 
 
+# Product catalog backend: "json" keeps the catalog in each worker's memory,
+# "sqlite" serves ranked pages from an FTS5 index in the default database
+# (built with `manage.py build_catalog_index`, or lazily on first use),
+# "compact" mmaps one columnar file shared by all workers (`manage.py build_compact_catalog`).
+CATALOG_BACKEND = os.environ.get("CATALOG_BACKEND", "json")
+COMPACT_CATALOG_PATH = os.environ.get("COMPACT_CATALOG_PATH", "")
+CATALOG_POOL_SIZE = int(os.environ.get("CATALOG_POOL_SIZE", "50"))
+# "keywords" = exact keyword-count overlap, "tfidf" = cosine similarity from the
+# LSH vector index (`manage.py build_vector_index`, or built in memory on first use).
+CATALOG_RANKING = os.environ.get("CATALOG_RANKING", "keywords")
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -128,8 +203,23 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
 STATIC_URL = "/static/"
+# the app's own images/css live in static/; STATIC_ROOT is build output
+# (`manage.py collectstatic`, run by build_files.sh on deploy) and not committed
+STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
+# collectstatic writes content-hashed copies (+ staticfiles.json manifest that
+# {% static %} resolves through) and .gz/.br variants of text assets.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "core.storage.CompressedManifestStaticFilesStorage"},
+}
+
+# Serve STATIC_ROOT from Django with long-lived cache headers (core/static_serving.py).
+# On Vercel /static/ is served from the collectstatic output by the platform
+# (see vercel.json), so this only matters elsewhere.
+SERVE_STATIC = os.environ.get("SERVE_STATIC", "1") == "1"
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
@@ -137,3 +227,19 @@ MEDIA_ROOT = BASE_DIR / "media"
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# core.* INFO logs (Nosana token usage, warmup, swipe log) go to stderr, which
+# is what runserver and the Vercel function logs show.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "core": {
+            "handlers": ["console"],
+            "level": os.environ.get("CORE_LOG_LEVEL", "INFO"),
+        },
+    },
+}
@@ -1,12 +1,16 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
+from core.static_serving import serve_static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('core.urls')),
 ]
 
+if getattr(settings, "SERVE_STATIC", False) and not settings.DEBUG:
+    urlpatterns.insert(0, re_path(r"^%s(?P<path>.*)$" % settings.STATIC_URL.lstrip("/"), serve_static))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file